@@ -0,0 +1,348 @@
+import asyncio
+import copy
+import functools
+import hashlib
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Value
+from django.http import JsonResponse
+from django.utils.translation import gettext
+from rest_framework.authtoken.models import Token
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .autocomplete import ingredient_search
+from .cache import (
+    RECIPES_KEY,
+    RESPONSE_KEY,
+    count,
+    get_user_flags,
+    get_version,
+    set_user_flags
+)
+from .filters import RecipeFilter
+from .images import get_variant_urls
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from users.models import Subscribe, User
+
+RECIPE_FIELDS = (
+    'id',
+    'author_id',
+    'is_favorited',
+    'is_in_shopping_cart',
+    'name',
+    'image',
+    'image_variants',
+    'text',
+    'cooking_time',
+)
+USER_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data,
+        status=status,
+        safe=False,
+        json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def not_found():
+    return json_response({'detail': gettext('Not found.')}, status=404)
+
+
+async def get_user(request):
+    header = request.headers.get('Authorization', '').split()
+    if not header or header[0].lower() != 'token':
+        return AnonymousUser()
+    if len(header) != 2:
+        return None
+    token = await (
+        Token.objects
+        .select_related('user')
+        .filter(key=header[1], user__is_active=True)
+        .afirst()
+    )
+    return token and token.user
+
+
+def read_only(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return json_response(
+                {'detail': gettext('Method "{method}" not allowed.').format(
+                    method=request.method
+                )},
+                status=405
+            )
+        user = await get_user(request)
+        if user is None:
+            return json_response(
+                {'detail': gettext('Invalid token.')},
+                status=401
+            )
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@sync_to_async
+def get_cached(template, request, models):
+    key = template.format(
+        hashlib.md5(
+            f'async:{request.build_absolute_uri()}'.encode()
+        ).hexdigest(),
+        get_version(models)
+    )
+    data = cache.get(key)
+    count('miss' if data is None else 'hit')
+    return key, data
+
+
+async def cached_response(request, models, build):
+    key, data = await get_cached(RESPONSE_KEY, request, models)
+    if data is None:
+        data = await build()
+        if data is None:
+            return not_found()
+        await cache.aset(key, data, settings.API_CACHE_TIMEOUT)
+    return json_response(data)
+
+
+async def values(queryset):
+    return [row async for row in queryset.aiterator()]
+
+
+async def get_tags(recipe_ids):
+    tags = defaultdict(list)
+    for row in await values(
+        Recipe.tags.through.objects
+        .filter(recipe__in=recipe_ids)
+        .values('recipe_id', *(f'tag__{field}' for field in TAG_FIELDS))
+        .order_by('tag__slug')
+    ):
+        tags[row.pop('recipe_id')].append({
+            field: row[f'tag__{field}'] for field in TAG_FIELDS
+        })
+    return tags
+
+
+async def get_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    for row in await values(
+        IngredientInRecipe.objects
+        .filter(recipe__in=recipe_ids)
+        .values(
+            'recipe_id',
+            'amount',
+            *(f'ingredient__{field}' for field in INGREDIENT_FIELDS)
+        )
+        .order_by('id')
+    ):
+        ingredients[row['recipe_id']].append({
+            **{
+                field: row[f'ingredient__{field}']
+                for field in INGREDIENT_FIELDS
+            },
+            'amount': row['amount'],
+        })
+    return ingredients
+
+
+async def get_authors(user, author_ids):
+    is_subscribed = Value(False)
+    if user.is_authenticated:
+        is_subscribed = Exists(
+            Subscribe.objects.filter(user=user, author=OuterRef('pk'))
+        )
+    return {
+        row['id']: row for row in await values(
+            User.objects
+            .filter(pk__in=author_ids)
+            .annotate(is_subscribed=is_subscribed)
+            .values(*USER_FIELDS, 'is_subscribed')
+        )
+    }
+
+
+async def build_recipes(request, recipes):
+    recipe_ids = [recipe['id'] for recipe in recipes]
+    tags, ingredients, authors = await asyncio.gather(
+        get_tags(recipe_ids),
+        get_ingredients(recipe_ids),
+        get_authors(
+            request.user,
+            {recipe['author_id'] for recipe in recipes}
+        ),
+    )
+    storage = Recipe._meta.get_field('image').storage
+    return [
+        {
+            'id': recipe['id'],
+            'tags': tags[recipe['id']],
+            'author': authors[recipe['author_id']],
+            'ingredients': ingredients[recipe['id']],
+            'is_favorited': recipe['is_favorited'],
+            'is_in_shopping_cart': recipe['is_in_shopping_cart'],
+            'name': recipe['name'],
+            'image': (
+                request.build_absolute_uri(storage.url(recipe['image']))
+                if recipe['image'] else None
+            ),
+            'image_variants': get_variant_urls(
+                recipe['image_variants'], request
+            ),
+            'text': recipe['text'],
+            'cooking_time': recipe['cooking_time'],
+        }
+        for recipe in recipes
+    ]
+
+
+@sync_to_async
+def filter_recipes(request):
+    filterset = RecipeFilter(
+        request.GET,
+        queryset=Recipe.objects.with_user_flags(request.user),
+        request=request
+    )
+    if not filterset.is_valid():
+        return None, filterset.errors
+    return filterset.qs, None
+
+
+def get_page(request):
+    page, limit = request.GET.get('page', '1'), request.GET.get('limit', '')
+    page_size = settings.PAGE_SIZE
+    if limit.isdigit() and int(limit):
+        page_size = int(limit)
+    if not page.isdigit() or not int(page):
+        return None, page_size
+    return int(page), page_size
+
+
+def get_page_link(request, page):
+    url = request.build_absolute_uri()
+    if page == 1:
+        return remove_query_param(url, 'page')
+    return replace_query_param(url, 'page', page)
+
+
+@read_only
+async def recipe_list(request):
+    user = request.user
+    cacheable = not any(
+        param in request.GET for param in RecipeViewSet.uncached_params
+    ) and (not user.is_authenticated or not any(
+        param in request.GET for param in RecipeViewSet.user_filters
+    ))
+    if cacheable:
+        key, data = await get_cached(
+            RECIPES_KEY, request, RecipeViewSet.cache_models
+        )
+        if data is not None:
+            if user.is_authenticated:
+                set_user_flags(
+                    data['results'],
+                    await sync_to_async(get_user_flags)(user)
+                )
+            return json_response(data)
+    queryset, errors = await filter_recipes(request)
+    if errors:
+        return json_response(errors, status=400)
+    page, page_size = get_page(request)
+    if page is None:
+        return json_response({'detail': gettext('Invalid page.')}, 404)
+    offset = (page - 1) * page_size
+    total, recipes = await asyncio.gather(
+        queryset.acount(),
+        values(queryset.values(*RECIPE_FIELDS)[offset:offset + page_size]),
+    )
+    if page > 1 and offset >= total:
+        return json_response({'detail': gettext('Invalid page.')}, 404)
+    data = {
+        'count': total,
+        'next': (
+            get_page_link(request, page + 1)
+            if offset + page_size < total else None
+        ),
+        'previous': get_page_link(request, page - 1) if page > 1 else None,
+        'results': await build_recipes(request, recipes),
+    }
+    if cacheable:
+        cached = copy.deepcopy(data)
+        set_user_flags(cached['results'])
+        await cache.aset(key, cached, settings.API_CACHE_TIMEOUT)
+    return json_response(data)
+
+
+@read_only
+async def recipe_detail(request, pk):
+    recipe = await (
+        Recipe.objects
+        .with_user_flags(request.user)
+        .filter(pk=pk)
+        .values(*RECIPE_FIELDS)
+        .afirst()
+    )
+    if recipe is None:
+        return not_found()
+    recipe, = await build_recipes(request, [recipe])
+    return json_response(recipe)
+
+
+@read_only
+async def tag_list(request):
+    return await cached_response(
+        request,
+        TagViewSet.cache_models,
+        lambda: values(Tag.objects.values(*TAG_FIELDS))
+    )
+
+
+@read_only
+async def tag_detail(request, pk):
+    return await cached_response(
+        request,
+        TagViewSet.cache_models,
+        Tag.objects.filter(pk=pk).values(*TAG_FIELDS).afirst
+    )
+
+
+@sync_to_async
+def search_ingredients(name, limit):
+    return [
+        {field: getattr(ingredient, field) for field in INGREDIENT_FIELDS}
+        for ingredient in ingredient_search.search(name, limit)
+    ]
+
+
+@read_only
+async def ingredient_list(request):
+    name = request.GET.get('name')
+    limit = request.GET.get('limit', '')
+    return await cached_response(
+        request,
+        IngredientViewSet.cache_models,
+        lambda: search_ingredients(
+            name,
+            int(limit) if limit.isdigit() and int(limit) else None
+        ) if name else values(Ingredient.objects.values(*INGREDIENT_FIELDS))
+    )
+
+
+@read_only
+async def ingredient_detail(request, pk):
+    return await cached_response(
+        request,
+        IngredientViewSet.cache_models,
+        Ingredient.objects.filter(pk=pk).values(*INGREDIENT_FIELDS).afirst
+    )
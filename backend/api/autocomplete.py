@@ -0,0 +1,140 @@
+import bisect
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.utils.module_loading import import_string
+
+from .cache import get_version
+from recipes.models import Ingredient
+
+
+def trigrams(text):
+    result = set()
+    for word in re.findall(r'\w+', text):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class IngredientIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = (None, None)
+
+    def invalidate(self):
+        with self.lock:
+            self.state = (None, None)
+
+    def build(self):
+        ingredients = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        grams = defaultdict(list)
+        sizes = []
+        for position, (key, *_) in enumerate(ingredients):
+            key_grams = trigrams(key)
+            sizes.append(len(key_grams))
+            for gram in key_grams:
+                grams[gram].append(position)
+        return {
+            'keys': [ingredient[0] for ingredient in ingredients],
+            'ingredients': ingredients,
+            'grams': grams,
+            'sizes': sizes,
+        }
+
+    def get_snapshot(self):
+        version = get_version((Ingredient,))
+        cached_version, snapshot = self.state
+        if snapshot is not None and cached_version == version:
+            return snapshot
+        snapshot = self.build()
+        with self.lock:
+            self.state = (version, snapshot)
+        return snapshot
+
+    def search(self, query, limit=None):
+        key = query.strip().casefold()
+        if not key:
+            return []
+        snapshot = self.get_snapshot()
+        keys = snapshot['keys']
+        found = []
+        position = bisect.bisect_left(keys, key)
+        while position < len(keys) and keys[position].startswith(key):
+            found.append(position)
+            position += 1
+        if limit is None or len(found) < limit:
+            found.extend(
+                position for position, name in enumerate(keys)
+                if key in name and not name.startswith(key)
+            )
+        if limit is None or len(found) < limit:
+            found.extend(self.similar(snapshot, key, exclude=set(found)))
+        if limit is not None:
+            found = found[:limit]
+        return [
+            Ingredient(id=pk, name=name, measurement_unit=measurement_unit)
+            for _, pk, name, measurement_unit
+            in (snapshot['ingredients'][position] for position in found)
+        ]
+
+    @staticmethod
+    def similar(snapshot, key, exclude):
+        key_grams = trigrams(key)
+        shared = Counter()
+        for gram in key_grams:
+            shared.update(snapshot['grams'].get(gram, ()))
+        scored = []
+        for position, count in shared.items():
+            if position in exclude:
+                continue
+            similarity = count / (
+                len(key_grams) + snapshot['sizes'][position] - count
+            )
+            if similarity >= settings.INGREDIENT_SEARCH_SIMILARITY:
+                scored.append((-similarity, snapshot['keys'][position],
+                               position))
+        return [position for *_, position in sorted(scored)]
+
+
+class PostgresIngredientSearch:
+    def invalidate(self):
+        pass
+
+    def search(self, query, limit=None):
+        query = query.strip()
+        if not query:
+            return []
+        queryset = (
+            Ingredient.objects
+            .annotate(
+                similarity=TrigramSimilarity('name', query),
+                rank=Case(
+                    When(name__istartswith=query, then=Value(0)),
+                    When(name__icontains=query, then=Value(1)),
+                    default=Value(2),
+                ),
+                score=Case(
+                    When(name__icontains=query, then=Value(1.0)),
+                    default=F('similarity'),
+                    output_field=FloatField(),
+                ),
+            )
+            .filter(Q(name__icontains=query) | Q(name__trigram_similar=query))
+            .order_by('rank', '-score', 'name')
+        )
+        if limit is not None:
+            return queryset[:limit]
+        return queryset
+
+
+ingredient_search = import_string(settings.INGREDIENT_SEARCH_BACKEND)()
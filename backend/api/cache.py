@@ -0,0 +1,168 @@
+import copy
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+VERSION_KEY = 'api:version:{}'
+RESPONSE_KEY = 'api:response:{}:{}'
+RECIPES_KEY = 'api:recipes:{}:{}'
+USER_VERSION_KEY = 'api:version:user:{}'
+USER_FLAGS_KEY = 'api:user_flags:{}:{}'
+STATS_KEY = 'api:stats:{}'
+STATS = ('hit', 'miss', 'not_modified')
+
+
+def get_version(models):
+    keys = [VERSION_KEY.format(model._meta.label_lower) for model in models]
+    versions = cache.get_many(keys)
+    if len(versions) < len(keys):
+        now = time.time()
+        for key in keys:
+            if key not in versions:
+                cache.add(key, now, None)
+        versions = cache.get_many(keys)
+    return max(versions.values(), default=0)
+
+
+def invalidate(model):
+    cache.set(VERSION_KEY.format(model._meta.label_lower), time.time(), None)
+
+
+def get_user_flags(user):
+    version = cache.get_or_set(
+        USER_VERSION_KEY.format(user.pk), time.time, None
+    )
+    key = USER_FLAGS_KEY.format(user.pk, version)
+    flags = cache.get(key)
+    if flags is None:
+        flags = {
+            'favorites': set(
+                user.favouring.values_list('recipe', flat=True)
+            ),
+            'shopping_cart': set(
+                user.shopping.values_list('recipe', flat=True)
+            ),
+            'subscriptions': set(
+                user.subscriber.values_list('author', flat=True)
+            ),
+        }
+        cache.set(key, flags, settings.API_CACHE_TIMEOUT)
+    return flags
+
+
+def invalidate_user(user):
+    cache.set(USER_VERSION_KEY.format(user.pk), time.time(), None)
+
+
+def set_user_flags(recipes, flags=None):
+    for recipe in recipes:
+        if flags is None:
+            recipe['is_favorited'] = False
+            recipe['is_in_shopping_cart'] = False
+            recipe['author']['is_subscribed'] = False
+            continue
+        recipe['is_favorited'] = recipe['id'] in flags['favorites']
+        recipe['is_in_shopping_cart'] = (
+            recipe['id'] in flags['shopping_cart']
+        )
+        recipe['author']['is_subscribed'] = (
+            recipe['author']['id'] in flags['subscriptions']
+        )
+
+
+def count(name):
+    key = STATS_KEY.format(name)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_stats():
+    values = cache.get_many([STATS_KEY.format(name) for name in STATS])
+    return {name: values.get(STATS_KEY.format(name), 0) for name in STATS}
+
+
+class CachedResponseMixin:
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        version = get_version(self.cache_models)
+        path = hashlib.md5(
+            f'{request.accepted_renderer.format}:{request.get_full_path()}'
+            .encode()
+        ).hexdigest()
+        etag = quote_etag(f'{path}-{version}')
+        last_modified = int(version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            count('not_modified')
+        else:
+            key = RESPONSE_KEY.format(path, version)
+            data = cache.get(key)
+            if data is not None:
+                count('hit')
+                response = Response(data, headers={'X-Cache': 'HIT'})
+            else:
+                count('miss')
+                response = handler(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                cache.set(key, response.data, settings.API_CACHE_TIMEOUT)
+                response['X-Cache'] = 'MISS'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class CachedRecipeListMixin:
+    cache_models = ()
+    user_filters = ('is_favorited', 'is_in_shopping_cart')
+    uncached_params = ()
+
+    def list(self, request, *args, **kwargs):
+        user = request.user
+        if any(
+            param in request.query_params for param in self.uncached_params
+        ) or user.is_authenticated and any(
+            param in request.query_params for param in self.user_filters
+        ):
+            return super().list(request, *args, **kwargs)
+        key = RECIPES_KEY.format(
+            hashlib.md5(
+                f'{request.accepted_renderer.format}:'
+                f'{request.build_absolute_uri()}'.encode()
+            ).hexdigest(),
+            get_version(self.cache_models)
+        )
+        data = cache.get(key)
+        if data is None:
+            count('miss')
+            response = super().list(request, *args, **kwargs)
+            if response.status_code == 200:
+                data = copy.deepcopy(response.data)
+                set_user_flags(data['results'])
+                cache.set(key, data, settings.API_CACHE_TIMEOUT)
+                response['X-Cache'] = 'MISS'
+            return response
+        count('hit')
+        if user.is_authenticated:
+            set_user_flags(data['results'], get_user_flags(user))
+        return Response(data, headers={'X-Cache': 'HIT'})
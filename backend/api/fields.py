@@ -0,0 +1,53 @@
+import io
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import ImageField
+
+
+class RecipeImageField(Base64ImageField):
+    def to_internal_value(self, base64_data):
+        if isinstance(base64_data, UploadedFile):
+            return self.file_to_internal_value(base64_data)
+        if isinstance(base64_data, str):
+            payload = base64_data.rpartition(';base64,')[2].rstrip('=')
+            if len(payload) * 3 // 4 > settings.IMAGE_MAX_SIZE:
+                raise ValidationError(
+                    f'Размер изображения превышает '
+                    f'{settings.IMAGE_MAX_SIZE // 1024 // 1024} МБ.'
+                )
+        return super().to_internal_value(base64_data)
+
+    def file_to_internal_value(self, file):
+        if file.size > settings.IMAGE_MAX_SIZE:
+            raise ValidationError(
+                f'Размер изображения превышает '
+                f'{settings.IMAGE_MAX_SIZE // 1024 // 1024} МБ.'
+            )
+        image_format = self.check_dimensions(file).lower()
+        extension = 'jpg' if image_format == 'jpeg' else image_format
+        if extension not in self.ALLOWED_TYPES:
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        file.seek(0)
+        file.name = f'{uuid.uuid4()}.{extension}'
+        return ImageField.to_internal_value(self, file)
+
+    def check_dimensions(self, file):
+        try:
+            image = Image.open(file)
+        except (OSError, Image.DecompressionBombError):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        if max(image.size) > settings.IMAGE_MAX_DIMENSION:
+            raise ValidationError(
+                f'Размер изображения превышает '
+                f'{settings.IMAGE_MAX_DIMENSION} пикселей по стороне.'
+            )
+        return image.format
+
+    def get_file_extension(self, filename, decoded_file):
+        self.check_dimensions(io.BytesIO(decoded_file))
+        return super().get_file_extension(filename, decoded_file)
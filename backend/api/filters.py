@@ -1,22 +1,38 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from .cache import get_version
+from .search import recipe_search
+from recipes.models import Recipe, Tag
 
 
-class IngredientSearch(SearchFilter):
-    search_param = 'name'
+class TagSlugs:
+    def __init__(self):
+        self.state = (None, {})
 
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+    def __deepcopy__(self, memo):
+        return self
+
+    def get(self):
+        version = get_version((Tag,))
+        cached_version, slugs = self.state
+        if cached_version != version:
+            slugs = dict(Tag.objects.values_list('slug', 'id'))
+            self.state = (version, slugs)
+        return slugs
+
+    def choices(self):
+        return [(slug, slug) for slug in self.get()]
+
+
+tag_slugs = TagSlugs()
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_slugs.choices,
+        method='filter_tags',
+        label='Теги'
     )
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited',
@@ -26,6 +42,15 @@ class RecipeFilter(FilterSet):
         method='filter_is_in_shopping_cart',
         label='В списке покупок'
     )
+    search = filters.CharFilter(
+        method='filter_search',
+        label='Поиск'
+    )
+    ordering = filters.OrderingFilter(
+        fields=('favorites_count', 'carts_count', 'pub_date'),
+        method='order_recipes',
+        label='Сортировка'
+    )
 
     class Meta:
         model = Recipe
@@ -33,9 +58,29 @@ class RecipeFilter(FilterSet):
             'is_favorited',
             'is_in_shopping_cart',
             'author',
-            'tags'
+            'tags',
+            'search',
+            'ordering'
         )
 
+    def filter_tags(self, queryset, name, value):
+        slugs = tag_slugs.get()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'),
+                tag__in=[slugs[slug] for slug in value]
+            )
+        ))
+
+    def filter_search(self, queryset, name, value):
+        queryset = recipe_search.filter(queryset, value)
+        if 'ordering' in self.data:
+            return queryset
+        return queryset.order_by('-rank', '-pub_date', '-id')
+
+    def order_recipes(self, queryset, name, value):
+        return queryset.order_by(*value, '-pub_date', '-id')
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user.pk
         if value and user:
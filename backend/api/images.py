@@ -0,0 +1,93 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .cache import invalidate
+from recipes.models import Recipe
+
+logger = logging.getLogger('api.images')
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS,
+    thread_name_prefix='image-variants'
+)
+
+
+def get_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def render(image, size, image_format, quality):
+    variant = image.copy()
+    variant.thumbnail(size, Image.Resampling.LANCZOS)
+    if image_format == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    buffer = io.BytesIO()
+    variant.save(buffer, format=image_format, quality=quality)
+    return ContentFile(buffer.getvalue())
+
+
+def build_variants(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'image', 'image_variants'
+    ).first()
+    if recipe is None or not recipe['image']:
+        return None
+    storage = get_storage()
+    with storage.open(recipe['image']) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    root = os.path.splitext(os.path.basename(recipe['image']))[0]
+    variants = {}
+    for name, options in settings.IMAGE_VARIANTS.items():
+        extension = options['image_format'].lower().replace('jpeg', 'jpg')
+        variants[name] = storage.save(
+            f'{settings.IMAGE_VARIANTS_DIR}/{root}_{name}.{extension}',
+            render(image, **options)
+        )
+    if not Recipe.objects.filter(
+        pk=recipe_id, image=recipe['image']
+    ).update(image_variants=variants):
+        stale = variants.values()
+    else:
+        stale = set(recipe['image_variants'].values()) - set(
+            variants.values()
+        )
+        invalidate(Recipe)
+    for path in stale:
+        storage.delete(path)
+    return variants
+
+
+def build_variants_task(recipe_id):
+    try:
+        return build_variants(recipe_id)
+    except Exception:
+        logger.exception(
+            'Failed to build image variants for recipe %s', recipe_id
+        )
+    finally:
+        connection.close()
+
+
+def schedule_variants(recipe):
+    transaction.on_commit(
+        lambda: executor.submit(build_variants_task, recipe.pk)
+    )
+
+
+def get_variant_urls(variants, request=None):
+    storage = get_storage()
+    urls = {}
+    for name in settings.IMAGE_VARIANTS:
+        url = storage.url(variants[name]) if name in variants else None
+        if url and request is not None:
+            url = request.build_absolute_uri(url)
+        urls[name] = url
+    return urls
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api.images import build_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии и WebP-варианты изображений рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать варианты для всех рецептов, а не только новых.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        built = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            try:
+                built += build_variants(recipe_id) is not None
+            except OSError as error:
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+        return self.style.SUCCESS(f'Обработано изображений: {built}')
@@ -0,0 +1,117 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.autocomplete import PostgresIngredientSearch
+from api.filters import RecipeFilter
+from api.views import UserViewSet
+from recipes.models import Recipe, ShoppingListItem, Tag
+from users.models import User
+
+
+def sequential_scans(plan):
+    if connection.vendor == 'postgresql':
+        return re.findall(r'Seq Scan on (\w+)', plan)
+    return [
+        table for table, index in re.findall(
+            r'\bSCAN (\w+)( USING| VIRTUAL TABLE)?', plan
+        )
+        if not index
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет планы запросов основных эндпоинтов API и завершается '
+        'с ошибкой, если какой-либо из них читает таблицу целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='id пользователя, от имени которого строятся запросы.'
+        )
+
+    def handle(self, *args, **options):
+        user = (
+            User.objects.get(pk=options['user']) if options['user']
+            else User.objects.filter(shopping__isnull=False).first()
+            or User.objects.first()
+        )
+        if user is None:
+            raise CommandError('Нет данных: сначала заполните базу.')
+        failed = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset in self.get_querysets(user):
+                plan = queryset.explain()
+                scans = sequential_scans(plan)
+                if scans:
+                    failed.append(name)
+                    self.stderr.write(
+                        f'{name}: полное чтение {", ".join(scans)}\n{plan}'
+                    )
+                elif options['verbosity'] > 1:
+                    self.stdout.write(f'{name}:\n{plan}')
+        if failed:
+            raise CommandError(f'Полное чтение таблиц: {", ".join(failed)}')
+        return self.style.SUCCESS('Все запросы используют индексы.')
+
+    @staticmethod
+    def get_request(user, **params):
+        request = Request(RequestFactory().get('/', params))
+        request.user = user
+        return request
+
+    def get_querysets(self, user):
+        page = slice(0, settings.PAGE_SIZE)
+        recipes = Recipe.objects.with_user_flags(user)
+        filters = {
+            'author': user.pk,
+            'tags': list(Tag.objects.values_list('slug', flat=True)[:2]),
+            'is_favorited': 1,
+            'is_in_shopping_cart': 1,
+            'ordering': '-favorites_count',
+            'search': 'суп',
+        }
+        yield '/api/recipes/', recipes[page]
+        recipe = Recipe.objects.values_list('pk', flat=True).first()
+        yield '/api/recipes/{id}/similar/', Recipe.objects.similar_to(recipe)
+        yield (
+            '/api/recipes/recommended/',
+            Recipe.objects.recommended(user).with_user_flags(user)[page]
+        )
+        yield (
+            '/api/recipes/recommended/ (популярные)',
+            Recipe.objects.popular().with_user_flags(user)[page]
+        )
+        for param, value in filters.items():
+            request = self.get_request(user, **{param: value})
+            yield f'/api/recipes/?{param}=', RecipeFilter(
+                request.query_params, queryset=recipes, request=request
+            ).qs[page]
+        yield (
+            '/api/users/subscriptions/',
+            UserViewSet.get_subscriptions_queryset(
+                self.get_request(user)
+            )[page]
+        )
+        yield (
+            '/api/recipes/download_shopping_cart/',
+            ShoppingListItem.objects
+            .filter(user=user)
+            .values('ingredient__name', 'ingredient__measurement_unit')
+            .order_by('ingredient__name', 'ingredient__measurement_unit')
+        )
+        if connection.vendor == 'postgresql':
+            yield (
+                '/api/ingredients/?name=',
+                PostgresIngredientSearch().search('абр', settings.PAGE_SIZE)
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.search import recipe_search
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс рецептов.'
+
+    def handle(self, *args, **options):
+        recipe_search.rebuild()
+        return self.style.SUCCESS(
+            f'Проиндексировано рецептов: {Recipe.objects.count()}'
+        )
@@ -0,0 +1,198 @@
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger('api.metrics')
+
+current = ContextVar('api_metrics', default=None)
+
+
+class Timings:
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.query_budget = None
+        self.view = None
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'serializer;dur={self.serializer * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += time.perf_counter() - start
+        timings.queries += 1
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self, name, labels):
+        lines = []
+        total = 0
+        for bucket, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {total}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {total}')
+        return lines
+
+
+class Registry:
+    METRICS = (
+        ('api_request_duration_seconds', 'total', 'API_METRICS_BUCKETS'),
+        ('api_db_duration_seconds', 'db', 'API_METRICS_BUCKETS'),
+        (
+            'api_serializer_duration_seconds',
+            'serializer',
+            'API_METRICS_BUCKETS'
+        ),
+        ('api_db_queries', 'queries', 'API_METRICS_QUERY_BUCKETS'),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = defaultdict(dict)
+
+    def observe(self, view, method, values):
+        with self.lock:
+            histograms = self.histograms[(view, method)]
+            for name, key, buckets in self.METRICS:
+                if name not in histograms:
+                    histograms[name] = Histogram(getattr(settings, buckets))
+                histograms[name].observe(values[key])
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, *_ in self.METRICS:
+                lines.append(f'# TYPE {name} histogram')
+                for (view, method), histograms in sorted(
+                    self.histograms.items()
+                ):
+                    lines.extend(histograms[name].render(
+                        name, f'view="{view}",method="{method}"'
+                    ))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class ApiMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if hasattr(self, '_is_coroutine'):
+            return self.__acall__(request)
+        if not request.path.startswith(settings.API_METRICS_PREFIX):
+            return self.get_response(request)
+        timings = Timings()
+        token = current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timings, start)
+
+    async def __acall__(self, request):
+        if not request.path.startswith(settings.API_METRICS_PREFIX):
+            return await self.get_response(request)
+        timings = Timings()
+        token = current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timings, start)
+
+    @staticmethod
+    def finish(request, response, timings, start):
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        view = timings.view or (match.view_name if match else 'unresolved')
+        registry.observe(view, request.method, {
+            'total': total,
+            'db': timings.db,
+            'serializer': timings.serializer,
+            'queries': timings.queries,
+        })
+        response['Server-Timing'] = timings.server_timing(total)
+        logger.debug(
+            '%s %s %s: %s', request.method, request.path,
+            response.status_code, response['Server-Timing']
+        )
+        if timings.query_budget is not None and (
+            timings.queries > timings.query_budget
+        ):
+            logger.warning(
+                '%s %s: %d queries, budget %d',
+                request.method, view, timings.queries, timings.query_budget
+            )
+        return response
+
+
+def timed(method):
+    def wrapper(*args, **kwargs):
+        timings = current.get()
+        if timings is None:
+            return method(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings.serializer += time.perf_counter() - start
+    return wrapper
+
+
+class MetricsMixin:
+    query_budget = None
+
+    def initial(self, request, *args, **kwargs):
+        timings = current.get()
+        if timings is not None:
+            timings.view = f'{type(self).__name__}.{self.action}'
+            timings.query_budget = self.get_query_budget()
+        super().initial(request, *args, **kwargs)
+
+    def get_query_budget(self):
+        if isinstance(self.query_budget, dict):
+            return self.query_budget.get(self.action)
+        return self.query_budget
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        serializer.to_representation = timed(serializer.to_representation)
+        return serializer
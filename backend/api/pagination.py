@@ -1,7 +1,112 @@
+import json
+
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
-class Paginator(PageNumberPagination):
+class CursorPaginator(CursorPagination):
     page_size = settings.PAGE_SIZE
     page_size_query_param = 'limit'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps([
+            str(
+                instance[field.lstrip('-')] if isinstance(instance, dict)
+                else getattr(instance, field.lstrip('-'))
+            )
+            for field in ordering
+        ])
+
+    def get_keyset(self, position, reverse):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            values = None
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        keyset = None
+        for field, value in reversed(list(zip(self.ordering, values))):
+            name = field.lstrip('-')
+            lookup = '__lt' if field.startswith('-') != reverse else '__gt'
+            after = Q(**{name + lookup: value})
+            keyset = after if keyset is None else (
+                after | Q(**{name: value}) & keyset
+            )
+        return keyset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, position = self.cursor or (0, False, None)
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering
+            ]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.get_keyset(position, reverse))
+            except (ValueError, DjangoValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > self.page_size:
+            following = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        started = position is not None or offset > 0
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = started, following is not None
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next, self.has_previous = following is not None, started
+            self.next_position, self.previous_position = following, position
+        self.display_page_controls = self.template is not None and (
+            self.has_next or self.has_previous
+        )
+        return self.page
+
+
+class PagePaginator(PageNumberPagination):
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+
+
+class Paginator(PagePaginator):
+    cursor_query_param = 'cursor'
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        conflicts = [
+            param for param in getattr(view, 'cursor_conflicts', ())
+            if param in request.query_params
+        ]
+        if conflicts:
+            raise ValidationError({
+                param: 'Не поддерживается вместе с cursor.'
+                for param in conflicts
+            })
+        self.cursor_paginator = CursorPaginator(
+            getattr(view, 'cursor_ordering', ('-id',))
+        )
+        return self.cursor_paginator.paginate_queryset(
+            queryset, request, view
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is None:
+            return super().get_paginated_response(data)
+        return self.cursor_paginator.get_paginated_response(data)
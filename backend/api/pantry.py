@@ -0,0 +1,214 @@
+import bisect
+import threading
+import uuid
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.utils.module_loading import import_string
+
+from recipes.models import IngredientInRecipe, Recipe
+
+GENERATION_KEY = 'api:recipe_match:generation'
+CHANGES_KEY = 'api:recipe_match:changes:{}'
+CHANGE_KEY = 'api:recipe_match:change:{}:{}'
+
+
+class RecipeIngredientIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = None
+
+    @staticmethod
+    def start_generation():
+        generation = uuid.uuid4().hex
+        cache.set(CHANGES_KEY.format(generation), 0, None)
+        cache.set(GENERATION_KEY, generation, None)
+        return generation, 0
+
+    @classmethod
+    def get_state(cls):
+        generation = cache.get(GENERATION_KEY)
+        number = None
+        if generation is not None:
+            number = cache.get(CHANGES_KEY.format(generation))
+        if number is None:
+            return cls.start_generation()
+        return generation, number
+
+    @classmethod
+    def record(cls, recipe_ids=None):
+        generation = cache.get(GENERATION_KEY)
+        try:
+            number = cache.incr(CHANGES_KEY.format(generation))
+        except ValueError:
+            cls.start_generation()
+            return
+        if recipe_ids is not None:
+            cache.set(
+                CHANGE_KEY.format(generation, number),
+                list(recipe_ids),
+                settings.API_CACHE_TIMEOUT
+            )
+
+    def invalidate(self):
+        self.record()
+
+    def update(self, recipe_ids):
+        self.record(recipe_ids)
+
+    def delete(self, recipe_ids):
+        self.record(recipe_ids)
+
+    @staticmethod
+    def load(queryset):
+        ingredients = defaultdict(list)
+        for recipe, ingredient in (
+            queryset
+            .values_list('recipe', 'ingredient')
+            .order_by('recipe_id', 'ingredient_id')
+            .iterator()
+        ):
+            ingredients[recipe].append(ingredient)
+        return ingredients
+
+    def build(self, generation, number):
+        recipes = self.load(IngredientInRecipe.objects.all())
+        postings = defaultdict(list)
+        for recipe, ingredients in recipes.items():
+            for ingredient in ingredients:
+                postings[ingredient].append(recipe)
+        return {
+            'generation': generation,
+            'number': number,
+            'recipes': {
+                recipe: array('I', ingredients)
+                for recipe, ingredients in recipes.items()
+            },
+            'postings': {
+                ingredient: array('I', recipe_ids)
+                for ingredient, recipe_ids in postings.items()
+            },
+        }
+
+    @staticmethod
+    def patch(snapshot, number, recipe_ids):
+        ingredients = RecipeIngredientIndex.load(
+            IngredientInRecipe.objects.filter(recipe__in=recipe_ids)
+        )
+        recipes = dict(snapshot['recipes'])
+        postings = dict(snapshot['postings'])
+        for recipe in recipe_ids:
+            old = set(recipes.pop(recipe, ()))
+            new = ingredients.get(recipe, ())
+            if new:
+                recipes[recipe] = array('I', new)
+            for ingredient in old.symmetric_difference(new):
+                posting = array('I', postings.get(ingredient, ()))
+                position = bisect.bisect_left(posting, recipe)
+                if ingredient in old:
+                    del posting[position]
+                else:
+                    posting.insert(position, recipe)
+                if posting:
+                    postings[ingredient] = posting
+                else:
+                    postings.pop(ingredient, None)
+        return {
+            'generation': snapshot['generation'],
+            'number': number,
+            'recipes': recipes,
+            'postings': postings,
+        }
+
+    def refresh(self, snapshot, generation, number):
+        if (
+            snapshot is None
+            or snapshot['generation'] != generation
+            or number < snapshot['number']
+            or number - snapshot['number'] > settings.RECIPE_MATCH_MAX_PATCH
+        ):
+            return self.build(generation, number)
+        keys = [
+            CHANGE_KEY.format(generation, change)
+            for change in range(snapshot['number'] + 1, number + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return self.build(generation, number)
+        return self.patch(snapshot, number, {
+            recipe for recipe_ids in changes.values() for recipe in recipe_ids
+        })
+
+    def get_snapshot(self):
+        snapshot = self.snapshot
+        generation, number = self.get_state()
+        if snapshot is not None and (
+            snapshot['generation'], snapshot['number']
+        ) == (generation, number):
+            return snapshot
+        refreshed = self.refresh(snapshot, generation, number)
+        with self.lock:
+            current = self.snapshot
+            if (
+                current is None
+                or current['generation'] != generation
+                or current['number'] <= number
+            ):
+                self.snapshot = refreshed
+        return refreshed
+
+    def match(self, ingredients, max_missing=None):
+        snapshot = self.get_snapshot()
+        postings = snapshot['postings']
+        matched = Counter()
+        for ingredient in set(ingredients):
+            matched.update(postings.get(ingredient, ()))
+        recipes = snapshot['recipes']
+        matches = []
+        for recipe, count in matched.items():
+            total = len(recipes[recipe])
+            if max_missing is None or total - count <= max_missing:
+                matches.append((recipe, total - count, total))
+        return sorted(
+            matches,
+            key=lambda match: (match[1], -match[2], -match[0])
+        )
+
+
+class SqlRecipeMatch:
+    def invalidate(self):
+        pass
+
+    def update(self, recipe_ids):
+        pass
+
+    def delete(self, recipe_ids):
+        pass
+
+    def match(self, ingredients, max_missing=None):
+        ingredients = list(set(ingredients))
+        queryset = (
+            Recipe.objects
+            .filter(Exists(IngredientInRecipe.objects.filter(
+                recipe=OuterRef('pk'),
+                ingredient__in=ingredients
+            )))
+            .annotate(
+                total=Count('ingredientinrecipe'),
+                missing=F('total') - Count(
+                    'ingredientinrecipe',
+                    filter=Q(ingredientinrecipe__ingredient__in=ingredients)
+                )
+            )
+            .order_by('missing', '-total', '-id')
+            .values_list('id', 'missing', 'total')
+        )
+        if max_missing is None:
+            return queryset
+        return queryset.filter(missing__lte=max_missing)
+
+
+recipe_match = import_string(settings.RECIPE_MATCH_BACKEND)()
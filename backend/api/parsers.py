@@ -0,0 +1,202 @@
+import base64
+import binascii
+import codecs
+import json
+import re
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+SPECIAL = re.compile(rb'["\\]')
+PLACEHOLDER = '\x00image'
+CHUNK_SIZE = 64 * 1024
+HEADER_LENGTH = 256
+
+
+class Base64StreamDecoder:
+    def __init__(self, limit):
+        self.limit = limit
+        self.file = TemporaryUploadedFile('image', None, 0, None)
+        self.header = b''
+        self.started = False
+        self.pending = b''
+        self.size = 0
+        self.failed = False
+
+    def feed(self, data):
+        if self.failed:
+            return
+        if not self.started:
+            self.header += data
+            if b',' not in self.header and len(self.header) <= HEADER_LENGTH:
+                return
+            data = self.start()
+        self.decode(data)
+
+    def start(self):
+        self.started = True
+        header, self.header = self.header, b''
+        if b',' in header:
+            return header.partition(b',')[2]
+        return header
+
+    def decode(self, data):
+        data = self.pending + re.sub(rb'\s', b'', data)
+        cut = len(data) - len(data) % 4
+        self.pending = data[cut:]
+        self.write(data[:cut])
+
+    def write(self, data):
+        try:
+            decoded = base64.b64decode(data, validate=True)
+        except binascii.Error:
+            self.fail()
+            return
+        self.size += len(decoded)
+        if self.size <= self.limit:
+            self.file.write(decoded)
+
+    def fail(self):
+        self.failed = True
+        self.file.seek(0)
+        self.file.truncate()
+
+    def close(self):
+        if not self.started and not self.failed:
+            self.decode(self.start())
+        if self.pending and not self.failed:
+            self.write(self.pending + b'=' * (-len(self.pending) % 4))
+        self.file.flush()
+        self.file.seek(0)
+        self.file.size = 0 if self.failed else self.size
+        return self.file
+
+
+class ImageStreamParser:
+    VALUE, STRING, IMAGE = range(3)
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.state = self.VALUE
+        self.escape = False
+        self.depth = 0
+        self.last = b''
+        self.key = None
+        self.key_buffer = None
+        self.rest = bytearray()
+        self.decoder = None
+        self.file = None
+
+    def feed(self, chunk):
+        position = 0
+        while position < len(chunk):
+            if self.state == self.IMAGE:
+                position = self.feed_image(chunk, position)
+            elif self.state == self.STRING:
+                position = self.feed_string(chunk, position)
+            else:
+                position = self.feed_value(chunk, position)
+
+    def feed_value(self, chunk, position):
+        byte = chunk[position:position + 1]
+        if byte == b'"':
+            return self.start_string(position)
+        if byte in b'{[':
+            self.depth += 1
+        elif byte in b'}]':
+            self.depth -= 1
+        if not byte.isspace():
+            self.last = byte
+        self.rest += byte
+        return position + 1
+
+    def start_string(self, position):
+        if self.depth == 1 and self.last == b':' and self.key == b'image':
+            self.state = self.IMAGE
+            self.decoder = Base64StreamDecoder(self.limit)
+            self.rest += json.dumps(PLACEHOLDER)[:-1].encode()
+        else:
+            self.state = self.STRING
+            if self.depth == 1 and self.last in (b'{', b','):
+                self.key_buffer = bytearray()
+            self.rest += b'"'
+        self.last = b'"'
+        return position + 1
+
+    def feed_string(self, chunk, position):
+        closed = False
+        if self.escape:
+            self.escape = False
+            end = position + 1
+        else:
+            match = SPECIAL.search(chunk, position)
+            end = match.end() if match else len(chunk)
+            if match:
+                self.escape = match.group() == b'\\'
+                closed = not self.escape
+        part = chunk[position:end]
+        self.rest += part
+        if self.key_buffer is not None:
+            self.key_buffer += part
+        if closed:
+            self.state = self.VALUE
+            if self.key_buffer is not None:
+                self.key = bytes(self.key_buffer[:-1])
+                self.key_buffer = None
+        return end
+
+    def feed_image(self, chunk, position):
+        if self.escape:
+            self.escape = False
+            byte = chunk[position:position + 1]
+            if byte == b'/':
+                self.decoder.feed(byte)
+            elif byte not in b'nrt':
+                self.decoder.fail()
+            return position + 1
+        match = SPECIAL.search(chunk, position)
+        end = match.start() if match else len(chunk)
+        self.decoder.feed(chunk[position:end])
+        if match is None:
+            return end
+        if chunk[end:end + 1] == b'\\':
+            self.escape = True
+        else:
+            self.state = self.VALUE
+            self.rest += b'"'
+            if self.file is not None:
+                self.file.close()
+            self.file = self.decoder.close()
+            self.decoder = None
+        return end + 1
+
+    def close(self):
+        for file in (self.file, self.decoder and self.decoder.file):
+            if file is not None:
+                file.close()
+
+
+class RecipeJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        parser = ImageStreamParser(settings.IMAGE_MAX_SIZE)
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            parser.feed(chunk)
+        try:
+            data = json.loads(parser.rest.decode(encoding))
+        except ValueError as exc:
+            parser.close()
+            raise ParseError(f'JSON parse error - {exc}')
+        if not (isinstance(data, dict) and data.get('image') == PLACEHOLDER):
+            parser.close()
+            return data
+        data['image'] = parser.file
+        request = parser_context.get('request')
+        if request is not None:
+            request._request.FILES.appendlist('image', parser.file)
+        return data
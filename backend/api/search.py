@@ -0,0 +1,143 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector
+)
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.expressions import RawSQL
+
+from recipes.models import IngredientInRecipe, Recipe
+
+FTS_TABLE = 'recipes_recipe_fts'
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+class RecipeSearch:
+    def update(self, recipe_ids):
+        pass
+
+    def delete(self, recipe_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def filter(self, queryset, query):
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+class PostgresRecipeSearch(RecipeSearch):
+    @staticmethod
+    def vector():
+        config = settings.RECIPE_SEARCH_CONFIG
+        ingredients = Subquery(
+            IngredientInRecipe.objects
+            .filter(recipe=OuterRef('pk'))
+            .values('recipe')
+            .annotate(names=StringAgg('ingredient__name', ' '))
+            .values('names')
+        )
+        return (
+            SearchVector('name', weight='A', config=config)
+            + SearchVector(ingredients, weight='B', config=config)
+            + SearchVector('text', weight='C', config=config)
+        )
+
+    def update(self, recipe_ids):
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            search_vector=self.vector()
+        )
+
+    def rebuild(self):
+        Recipe.objects.update(search_vector=self.vector())
+
+    def filter(self, queryset, query):
+        query = SearchQuery(
+            query,
+            config=settings.RECIPE_SEARCH_CONFIG,
+            search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        )
+
+
+class SqliteRecipeSearch(RecipeSearch):
+    def update(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        self.delete(recipe_ids)
+        self.insert(
+            f'WHERE r.id IN ({", ".join(["%s"] * len(recipe_ids))})',
+            recipe_ids
+        )
+
+    def delete(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+                f'({", ".join(["%s"] * len(recipe_ids))})',
+                recipe_ids
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.insert('', ())
+
+    @staticmethod
+    def insert(where, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+                f'SELECT r.id, r.name, group_concat(i.name, \' \'), r.text '
+                f'FROM recipes_recipe r '
+                f'LEFT JOIN recipes_ingredientinrecipe ri '
+                f'ON ri.recipe_id = r.id '
+                f'LEFT JOIN recipes_ingredient i ON i.id = ri.ingredient_id '
+                f'{where} GROUP BY r.id',
+                params
+            )
+
+    @staticmethod
+    def match(query):
+        return ' '.join(
+            f'"{word}"*' for word in re.findall(r'\w+', query.casefold())
+        )
+
+    def filter(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return queryset.none().annotate(
+                rank=Value(0.0, output_field=FloatField())
+            )
+        weights = ', '.join(map(str, FTS_WEIGHTS))
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)
+        )).annotate(rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND rowid = {Recipe._meta.db_table}.id',
+            (match,),
+            output_field=FloatField()
+        ))
+
+
+BACKENDS = {
+    'postgresql': PostgresRecipeSearch,
+    'sqlite': SqliteRecipeSearch,
+}
+
+recipe_search = BACKENDS.get(connection.vendor, RecipeSearch)()
@@ -3,12 +3,18 @@ from djoser.serializers import (
     UserSerializer as DjoserUserSerializer,
     UserCreateSerializer as DjoserUserCreateSerializer
 )
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 
+from .fields import RecipeImageField
+from .images import get_variant_urls, schedule_variants
 from recipes.models import (
+    FeedItem,
     Ingredient,
     IngredientInRecipe,
     Recipe,
+    ShoppingListItem,
     Tag
 )
 from users.models import User
@@ -25,6 +31,8 @@ class UserSerializer(DjoserUserSerializer):
         read_only_fields = ('id', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return obj.subscribing.filter(
             user=self.context.get('request').user.id
         ).exists()
@@ -60,11 +68,14 @@ class UserWithRecipesSerializer(UserSerializer):
         return value
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        queryset = obj.recipes.all()
-        recipes_limit = request.query_params.get('recipes_limit')
-        if recipes_limit:
-            queryset = queryset[:int(recipes_limit)]
+        if hasattr(obj, 'limited'):
+            queryset = obj.limited
+        else:
+            request = self.context.get('request')
+            queryset = obj.recipes.all()
+            recipes_limit = request.query_params.get('recipes_limit')
+            if recipes_limit:
+                queryset = queryset[:int(recipes_limit)]
         serializer = RecipeMinifiedSerializer(
             queryset,
             many=True
@@ -72,6 +83,8 @@ class UserWithRecipesSerializer(UserSerializer):
         return serializer.data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
 
@@ -129,6 +142,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -141,6 +155,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
@@ -151,11 +166,20 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return objects.filter(user=user).exists()
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return self.status(obj.favorite)
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return self.status(obj.shopping)
 
+    def get_image_variants(self, obj):
+        return get_variant_urls(
+            obj.image_variants, self.context.get('request')
+        )
+
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeWriteSerializer(
@@ -165,7 +189,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         queryset=Tag.objects.all(),
         many=True
     )
-    image = Base64ImageField()
+    image = RecipeImageField()
     author = UserSerializer(read_only=True)
 
     class Meta:
@@ -180,17 +204,34 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             'author'
         )
 
+    def validate_ingredients(self, value):
+        ids = [ingredient['id'] for ingredient in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться.'
+            )
+        ingredients = Ingredient.objects.in_bulk(ids)
+        missing = [str(pk) for pk in ids if pk not in ingredients]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(missing)}.'
+            )
+        for ingredient in value:
+            ingredient['ingredient'] = ingredients[ingredient['id']]
+        return value
+
     @staticmethod
     def add_ingredients(recipe, ingredients):
         ingredients_list = [
             IngredientInRecipe(
-                ingredient=Ingredient.objects.get(id=current_ingredient['id']),
+                ingredient=current_ingredient['ingredient'],
                 recipe=recipe,
                 amount=current_ingredient['amount']
             ) for current_ingredient in ingredients
         ]
         IngredientInRecipe.objects.bulk_create(ingredients_list)
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -200,26 +241,85 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         )
         recipe.tags.set(tags)
         self.add_ingredients(recipe, ingredients)
+        FeedItem.objects.publish(recipe)
+        schedule_variants(recipe)
         return recipe
 
+    @staticmethod
+    def update_tags(recipe, tags):
+        through = Recipe.tags.through
+        current = set(
+            through.objects.filter(recipe=recipe).values_list('tag', flat=True)
+        )
+        desired = {tag.id for tag in tags}
+        if current - desired:
+            through.objects.filter(
+                recipe=recipe,
+                tag__in=current - desired
+            ).delete()
+        if desired - current:
+            through.objects.bulk_create([
+                through(recipe=recipe, tag_id=tag)
+                for tag in desired - current
+            ])
+
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        current = {
+            row.ingredient_id: row
+            for row in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        amounts = {}
+        created, updated = [], []
+        for ingredient in ingredients:
+            row = current.pop(ingredient['id'], None)
+            if row is None:
+                amounts[ingredient['id']] = ingredient['amount']
+                created.append(IngredientInRecipe(
+                    recipe=recipe,
+                    ingredient=ingredient['ingredient'],
+                    amount=ingredient['amount']
+                ))
+            elif row.amount != ingredient['amount']:
+                amounts[ingredient['id']] = ingredient['amount'] - row.amount
+                row.amount = ingredient['amount']
+                updated.append(row)
+        for ingredient, row in current.items():
+            amounts[ingredient] = -row.amount
+        IngredientInRecipe.objects.remove(recipe, list(current))
+        if created:
+            IngredientInRecipe.objects.bulk_create(created)
+        if updated:
+            IngredientInRecipe.objects.bulk_update(updated, ('amount',))
+        ShoppingListItem.objects.change_recipe(recipe, amounts)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        instance.tags.clear()
-        instance.ingredients.clear()
-        instance.tags.set(tags)
-        self.add_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if tags is not None:
+            self.update_tags(instance, tags)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        recipe = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            schedule_variants(recipe)
+        return recipe
 
     def to_representation(self, instance):
+        request = self.context.get('request')
         return RecipeReadSerializer(
-            instance,
-            context={'request': self.context.get('request')}
+            Recipe.objects
+            .with_related(request.user)
+            .with_user_flags(request.user)
+            .get(pk=instance.pk),
+            context={'request': request}
         ).data
 
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -227,6 +327,45 @@ class RecipeMinifiedSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time',
         )
         read_only_fields = fields
+
+    def get_image_variants(self, obj):
+        return get_variant_urls(
+            obj.image_variants, self.context.get('request')
+        )
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_FAVORITE_LIMIT
+    )
+
+
+class SubscriptionsQuerySerializer(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(min_value=0, required=False)
+
+
+class RecipeMatchQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_MATCH_INGREDIENTS_LIMIT
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class RecipeMatchSerializer(RecipeReadSerializer):
+    missing_count = serializers.IntegerField()
+    coverage = serializers.FloatField()
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + (
+            'missing_count',
+            'coverage',
+        )
+        read_only_fields = fields
@@ -0,0 +1,239 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.dispatch import receiver
+
+from .autocomplete import ingredient_search
+from .cache import invalidate
+from .metrics import record_query
+from .pantry import recipe_match
+from .search import recipe_search
+from recipes.models import (
+    Favorite,
+    FeedItem,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeNeighbor,
+    ShoppingCart,
+    ShoppingListItem,
+    Tag
+)
+from recipes.signals import bulk_imported
+from users.models import Subscribe, User
+from users.signals import relations_changed
+
+
+@receiver((post_save, post_delete, bulk_imported), sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate(sender))
+    transaction.on_commit(ingredient_search.invalidate)
+
+
+@receiver((post_save, post_delete, bulk_imported), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate(sender))
+
+
+@receiver((post_save, post_delete, bulk_imported), sender=Recipe)
+def invalidate_recipes(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate(sender))
+
+
+@receiver((post_save, post_delete, bulk_imported), sender=User)
+def invalidate_users(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(lambda: invalidate(sender))
+
+
+def index_recipes(recipe_ids):
+    transaction.on_commit(lambda: recipe_search.update(recipe_ids))
+    transaction.on_commit(lambda: recipe_match.update(recipe_ids))
+    transaction.on_commit(lambda: invalidate(Recipe))
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_recipes((instance.pk,))
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    recipe_ids = (instance.pk,)
+    transaction.on_commit(lambda: recipe_search.delete(recipe_ids))
+    transaction.on_commit(lambda: recipe_match.delete(recipe_ids))
+    transaction.on_commit(lambda: invalidate(sender))
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def index_recipe_ingredients(
+    sender, instance, raw=False, origin=None, **kwargs
+):
+    if raw or getattr(origin, 'model', type(origin)) in (Recipe, User):
+        return
+    index_recipes((instance.recipe_id,))
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient_recipes(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        index_recipes(list(
+            IngredientInRecipe.objects
+            .filter(ingredient=instance)
+            .values_list('recipe', flat=True)
+        ))
+
+
+@receiver(bulk_imported, sender=Recipe)
+@receiver(bulk_imported, sender=IngredientInRecipe)
+@receiver(bulk_imported, sender=Ingredient)
+def reindex_recipes(sender, **kwargs):
+    transaction.on_commit(recipe_search.rebuild)
+    transaction.on_commit(recipe_match.invalidate)
+    transaction.on_commit(lambda: invalidate(Recipe))
+
+
+@receiver(pre_save, sender=Recipe)
+def outdate_neighbors(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.neighbors_outdated = True
+
+
+@receiver(pre_delete, sender=Recipe)
+def outdate_neighbor_of(sender, instance, **kwargs):
+    Recipe.objects.filter(
+        pk__in=RecipeNeighbor.objects
+        .filter(neighbor=instance)
+        .values('recipe')
+    ).update(neighbors_outdated=True)
+
+
+@receiver(bulk_imported, sender=IngredientInRecipe)
+@receiver(bulk_imported, sender=Recipe.tags.through)
+def outdate_all_neighbors(sender, **kwargs):
+    Recipe.objects.update(neighbors_outdated=True)
+
+
+def change_counter(sender, instance, delta):
+    queryset = sender.objects.using(instance._state.db)
+    queryset.change_counter(
+        (getattr(instance, queryset.target.attname),), delta
+    )
+
+
+@receiver(relations_changed)
+def change_counters(sender, targets, delta, using, **kwargs):
+    sender.objects.using(using).change_counter(targets, delta)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscribe)
+def increment_counter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscribe)
+def decrement_counter(sender, instance, origin=None, **kwargs):
+    target = sender.objects.all().target
+    if (
+        isinstance(origin, target.related_model)
+        and origin.pk == getattr(instance, target.attname)
+    ):
+        return
+    change_counter(sender, instance, -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ShoppingListItem.objects.change(
+            [instance.user_id],
+            ShoppingListItem.objects.recipe_amounts(instance.recipe_id)
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, origin=None, **kwargs):
+    if getattr(origin, 'model', type(origin)) not in (Recipe, User):
+        ShoppingListItem.objects.change(
+            [instance.user_id],
+            ShoppingListItem.objects.recipe_amounts(
+                instance.recipe_id, sign=-1
+            )
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    ShoppingListItem.objects.change_recipe(
+        instance,
+        ShoppingListItem.objects.recipe_amounts(instance, sign=-1)
+    )
+
+
+@receiver(pre_save, sender=IngredientInRecipe)
+def remember_recipe_ingredient(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        instance.previous_amount = (
+            sender.objects
+            .filter(pk=instance.pk)
+            .values_list('recipe', 'ingredient', 'amount')
+            .first()
+        )
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def change_shopping_lists(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    amounts = Counter({instance.ingredient_id: instance.amount})
+    previous = instance.__dict__.pop('previous_amount', None)
+    if previous is not None:
+        recipe, ingredient, amount = previous
+        if recipe == instance.recipe_id:
+            amounts[ingredient] -= amount
+        else:
+            ShoppingListItem.objects.change_recipe(
+                recipe, {ingredient: -amount}
+            )
+    ShoppingListItem.objects.change_recipe(instance.recipe_id, amounts)
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def remove_from_shopping_lists(sender, instance, origin=None, **kwargs):
+    if getattr(origin, 'model', type(origin)) not in (
+        Ingredient, Recipe, User
+    ):
+        ShoppingListItem.objects.change_recipe(
+            instance.recipe_id, {instance.ingredient_id: -instance.amount}
+        )
+
+
+@receiver(post_save, sender=Subscribe)
+def follow_author(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        FeedItem.objects.follow(instance.user, (instance.author_id,))
+
+
+@receiver(post_delete, sender=Subscribe)
+def unfollow_author(sender, instance, **kwargs):
+    FeedItem.objects.unfollow(instance.user, (instance.author_id,))
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
@@ -0,0 +1,1572 @@
+import base64
+import csv
+import io
+import json
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import (
+    SimpleUploadedFile,
+    TemporaryUploadedFile
+)
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient
+
+from .autocomplete import IngredientIndex
+from .cache import get_version, invalidate
+from .images import build_variants_task
+from .pantry import (
+    CHANGES_KEY,
+    GENERATION_KEY,
+    RecipeIngredientIndex,
+    SqlRecipeMatch
+)
+from .parsers import RecipeJSONParser
+from .search import recipe_search
+from .views import RecipeViewSet
+from recipes.models import (
+    Favorite,
+    FeedItem,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeNeighbor,
+    Recommendation,
+    ShoppingCart,
+    ShoppingListItem,
+    ShoppingListItemQuerySet,
+    Tag
+)
+from users.models import Subscribe, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04'
+    b'\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D'
+    b'\x01\x00;'
+)
+GIF_URI = 'data:image/gif;base64,' + base64.b64encode(GIF).decode()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeAPITestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                first_name='Автор',
+                last_name=str(number),
+                password='password'
+            )
+            for number in range(3)
+        ]
+        cls.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            first_name='Читатель',
+            last_name='Рецептов',
+            password='password'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}',
+                color=f'#00000{number}',
+                slug=f'tag{number}'
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}',
+                measurement_unit='г'
+            )
+            for number in range(6)
+        ]
+        cls.recipes = []
+        for number in range(12):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % 3],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+                image=SimpleUploadedFile('recipe.gif', GIF, 'image/gif')
+            )
+            recipe.tags.set(cls.tags[:number % 3 + 1])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=number + 1
+                )
+                for ingredient in cls.ingredients[:number % 4 + 1]
+            )
+            cls.recipes.append(recipe)
+        Subscribe.objects.create(user=cls.user, author=cls.authors[0])
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class RecipeQueryCountTest(RecipeAPITestCase):
+    def test_list_queries_do_not_depend_on_page_size(self):
+        for limit in (2, 12):
+            with self.subTest(limit=limit), self.assertNumQueries(6):
+                response = self.client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous_list_queries(self):
+        self.client.force_authenticate(None)
+        for limit in (2, 12):
+            with self.subTest(limit=limit), self.assertNumQueries(6):
+                self.client.get(f'/api/recipes/?limit={limit}')
+
+    def test_detail_queries(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(f'/api/recipes/{self.recipes[0].id}/')
+        self.assertTrue(response.data['is_favorited'])
+        self.assertTrue(response.data['author']['is_subscribed'])
+
+
+class CachedRecipeListTest(RecipeAPITestCase):
+    URL = '/api/recipes/?limit=12'
+
+    def flags(self, user, cache_status):
+        self.client.force_authenticate(user)
+        response = self.client.get(self.URL)
+        self.assertEqual(response['X-Cache'], cache_status)
+        return {
+            (recipe['id'], flag)
+            for recipe in response.data['results']
+            for flag, value in (
+                ('is_favorited', recipe['is_favorited']),
+                ('is_in_shopping_cart', recipe['is_in_shopping_cart']),
+                ('is_subscribed', recipe['author']['is_subscribed']),
+            )
+            if value
+        }
+
+    def test_flags_do_not_leak_between_users(self):
+        other = self.authors[1]
+        first, second, third = self.recipes[:3]
+        flags = {
+            (recipe.id, 'is_subscribed') for recipe in self.recipes
+            if recipe.author_id == self.authors[0].id
+        } | {
+            (first.id, 'is_favorited'),
+            (second.id, 'is_in_shopping_cart'),
+        }
+        self.assertEqual(self.flags(self.user, 'MISS'), flags)
+        self.assertEqual(self.flags(other, 'HIT'), set())
+        self.assertEqual(self.flags(None, 'HIT'), set())
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/recipes/{third.id}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self.flags(self.user, 'HIT'), flags | {(third.id, 'is_favorited')}
+        )
+        self.assertEqual(self.flags(other, 'HIT'), set())
+
+
+class QueryBudgetTest(RecipeAPITestCase):
+    def test_budgets_are_per_action(self):
+        recipe = self.recipes[5].id
+        with self.assertNoLogs('api.metrics', 'WARNING'):
+            self.client.get('/api/recipes/')
+            self.client.post(f'/api/recipes/{recipe}/shopping_cart/')
+        with mock.patch.dict(RecipeViewSet.query_budget, {'list': 1}):
+            with self.assertLogs('api.metrics', 'WARNING') as logs:
+                self.client.get('/api/recipes/')
+        self.assertRegex(
+            logs.output[0], r'RecipeViewSet\.list: \d+ queries, budget 1$'
+        )
+
+
+class TagFilterTest(RecipeAPITestCase):
+    def get_ids(self, *slugs):
+        response = self.client.get(
+            '/api/recipes/', {'tags': slugs, 'limit': 100}
+        )
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(ids), response.data['count'])
+        return ids
+
+    def expected(self, *slugs):
+        return sorted(
+            (
+                recipe.id for recipe in self.recipes
+                if {tag.slug for tag in recipe.tags.all()} & set(slugs)
+            ),
+            reverse=True
+        )
+
+    def test_tags(self):
+        for slugs in (
+            ('tag0',), ('tag2',), ('tag1', 'tag2'), ('tag0', 'tag1', 'tag2')
+        ):
+            with self.subTest(slugs=slugs):
+                ids = self.get_ids(*slugs)
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(ids, self.expected(*slugs))
+
+    def test_unknown_slug(self):
+        for slugs in (('unknown',), ('tag0', 'unknown')):
+            with self.subTest(slugs=slugs):
+                response = self.client.get('/api/recipes/', {'tags': slugs})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('tags', response.data)
+
+    def test_queries(self):
+        with self.assertNumQueries(7):
+            self.get_ids('tag0', 'tag1')
+        with self.assertNumQueries(6):
+            self.get_ids('tag1', 'tag2')
+
+
+class SubscriptionsTest(RecipeAPITestCase):
+    def test_subscriptions_are_ordered_by_newest_author(self):
+        Subscribe.objects.bulk_create(
+            Subscribe(user=self.user, author=author)
+            for author in self.authors[1:]
+        )
+        response = self.client.get('/api/users/subscriptions/?recipes_limit=1')
+        self.assertEqual(
+            [author['id'] for author in response.data['results']],
+            sorted((author.id for author in self.authors), reverse=True)
+        )
+        for author in response.data['results']:
+            self.assertEqual(len(author['recipes']), 1)
+            self.assertEqual(author['recipes_count'], 4)
+
+    def test_invalid_recipes_limit(self):
+        for recipes_limit in ('abc', '-1'):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self.client.get(
+                    '/api/users/subscriptions/',
+                    {'recipes_limit': recipes_limit}
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_subscribe_validates_recipes_limit_before_writing(self):
+        author = self.authors[1]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                f'/api/users/{author.id}/subscribe/?recipes_limit=abc'
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE'))
+        ])
+        self.assertFalse(
+            Subscribe.objects.filter(user=self.user, author=author).exists()
+        )
+
+    @mock.patch('api.views.invalidate_user')
+    def test_subscription_flags_are_invalidated_on_commit(self, invalidate):
+        author = self.authors[1]
+        for method, status in (('post', 201), ('delete', 204)):
+            with self.subTest(method=method):
+                invalidate.reset_mock()
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = getattr(self.client, method)(
+                        f'/api/users/{author.id}/subscribe/'
+                    )
+                    self.assertEqual(response.status_code, status)
+                    invalidate.assert_not_called()
+                invalidate.assert_called_once_with(self.user)
+
+
+class ShoppingListTest(RecipeAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for user, recipe in (
+            (cls.user, cls.recipes[3]),
+            (cls.user, cls.recipes[7]),
+            (cls.authors[0], cls.recipes[1]),
+            (cls.authors[0], cls.recipes[2]),
+        ):
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+
+    def assert_shopping_lists_match_carts(self):
+        self.assertEqual(
+            {
+                (user, ingredient): total_amount
+                for user, ingredient, total_amount
+                in ShoppingListItem.objects.values_list(
+                    'user', 'ingredient', 'total_amount'
+                )
+            },
+            {
+                (user, ingredient): total_amount
+                for user, ingredient, total_amount
+                in ShoppingListItem.objects.cart_totals()
+            }
+        )
+
+    def test_cart_endpoints(self):
+        url = f'/api/recipes/{self.recipes[5].id}/shopping_cart/'
+        self.client.post(url)
+        self.assert_shopping_lists_match_carts()
+        self.client.delete(f'/api/recipes/{self.recipes[3].id}/shopping_cart/')
+        self.assert_shopping_lists_match_carts()
+        self.client.delete(url)
+        self.assert_shopping_lists_match_carts()
+
+    def test_recipe_update_and_delete(self):
+        recipe = self.recipes[3]
+        self.client.force_authenticate(recipe.author)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 50},
+                    {'id': self.ingredients[5].id, 'amount': 5},
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_shopping_lists_match_carts()
+        self.client.delete(f'/api/recipes/{recipe.id}/')
+        self.assert_shopping_lists_match_carts()
+
+    def test_cart_rows_changed_outside_the_api(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[6])
+        self.assert_shopping_lists_match_carts()
+        ShoppingCart.objects.filter(recipe=self.recipes[7]).delete()
+        self.assert_shopping_lists_match_carts()
+
+    def test_recipe_ingredients_changed_outside_the_api(self):
+        row = IngredientInRecipe.objects.filter(recipe=self.recipes[3]).first()
+        row.amount += 10
+        row.save()
+        self.assert_shopping_lists_match_carts()
+        row.recipe = self.recipes[7]
+        row.ingredient = self.ingredients[5]
+        row.save()
+        self.assert_shopping_lists_match_carts()
+        IngredientInRecipe.objects.create(
+            recipe=self.recipes[1],
+            ingredient=self.ingredients[4],
+            amount=3
+        )
+        self.assert_shopping_lists_match_carts()
+        row.delete()
+        self.assert_shopping_lists_match_carts()
+        self.ingredients[0].delete()
+        self.assert_shopping_lists_match_carts()
+
+    def test_cascades(self):
+        self.authors[1].delete()
+        self.assert_shopping_lists_match_carts()
+        self.recipes[2].delete()
+        self.assert_shopping_lists_match_carts()
+        self.user.delete()
+        self.assert_shopping_lists_match_carts()
+
+    def test_concurrent_insert_is_retried(self):
+        ingredient = self.ingredients[5]
+        apply = ShoppingListItemQuerySet.apply
+        calls = []
+
+        def conflict_once(queryset, *args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise IntegrityError
+            ShoppingListItem.objects.create(
+                user=self.user, ingredient=ingredient, total_amount=7
+            )
+            return apply(queryset, *args)
+
+        with mock.patch.object(
+            ShoppingListItemQuerySet, 'apply', autospec=True,
+            side_effect=conflict_once
+        ):
+            ShoppingListItem.objects.change([self.user.id], {ingredient.id: 3})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(
+            ShoppingListItem.objects.get(
+                user=self.user, ingredient=ingredient
+            ).total_amount,
+            10
+        )
+
+    def test_download_lists_live_ingredients_only(self):
+        self.authors[1].delete()
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(
+            content.splitlines()[1:],
+            [
+                f'{ingredient.name} - {amount} '
+                f'{ingredient.measurement_unit}'
+                for ingredient, amount in zip(self.ingredients[:4], [4] * 4)
+            ]
+        )
+
+    def download(self, user, extension, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', **params
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename={user}_shopping_cart.{extension}'
+        )
+        return (
+            response['Content-Type'],
+            b''.join(response.streaming_content).decode()
+        )
+
+    def test_download_formats(self):
+        rows = [
+            (ingredient.name, amount, ingredient.measurement_unit)
+            for ingredient, amount
+            in zip(self.ingredients[:4], (14, 14, 12, 12))
+        ]
+        content_type, content = self.download(self.user, 'txt')
+        self.assertEqual(content_type, 'text/plain; charset=utf-8')
+        self.assertEqual(content.splitlines(), [
+            f'Список покупок {self.user}.',
+            *(f'{name} - {amount} {unit}' for name, amount, unit in rows)
+        ])
+        for params in (
+            {'data': {'format': 'csv'}}, {'HTTP_ACCEPT': 'text/csv'}
+        ):
+            with self.subTest(params=params):
+                content_type, content = self.download(
+                    self.user, 'csv', **params
+                )
+                self.assertEqual(content_type, 'text/csv; charset=utf-8')
+                self.assertEqual(
+                    list(csv.reader(StringIO(content))),
+                    [
+                        ['Ингредиент', 'Количество', 'Единица измерения'],
+                        *([name, str(amount), unit]
+                          for name, amount, unit in rows)
+                    ]
+                )
+        content_type, content = self.download(
+            self.user, 'json', data={'format': 'json'}
+        )
+        self.assertEqual(content_type, 'application/json; charset=utf-8')
+        self.assertEqual(json.loads(content), [
+            {'name': name, 'amount': amount, 'measurement_unit': unit}
+            for name, amount, unit in rows
+        ])
+
+    def test_download_empty_cart(self):
+        user = self.authors[2]
+        for extension, body in (
+            ('txt', f'Список покупок {user}.\n'),
+            ('csv', 'Ингредиент,Количество,Единица измерения\r\n'),
+            ('json', '[]'),
+        ):
+            with self.subTest(extension=extension):
+                self.assertEqual(
+                    self.download(
+                        user, extension, data={'format': extension}
+                    )[1],
+                    body
+                )
+
+
+class RecipeUpdateQueryCountTest(RecipeAPITestCase):
+    TAGS = Recipe.tags.through._meta.db_table
+    INGREDIENTS = IngredientInRecipe._meta.db_table
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[1]
+        self.client.force_authenticate(self.recipe.author)
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def patch(self, data, queries):
+        with self.assertNumQueries(queries):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.writes = {self.TAGS: [], self.INGREDIENTS: []}
+        for query in context.captured_queries:
+            words = query['sql'].replace('INTO ', '').replace('FROM ', '')
+            statement, table = words.split()[:2]
+            if statement == 'SELECT':
+                continue
+            if table.strip('"') in self.writes:
+                self.writes[table.strip('"')].append(statement)
+        return response
+
+    def current_ingredients(self):
+        return [
+            {'id': row.ingredient_id, 'amount': row.amount}
+            for row in IngredientInRecipe.objects.filter(recipe=self.recipe)
+        ]
+
+    def test_text_only_update(self):
+        self.patch({'text': 'Новое описание'}, 10)
+        self.assertEqual(self.writes, {self.TAGS: [], self.INGREDIENTS: []})
+
+    def test_amount_change(self):
+        ingredients = self.current_ingredients()
+        ingredients[0]['amount'] += 5
+        self.patch({'ingredients': ingredients}, 18)
+        self.assertEqual(self.writes[self.INGREDIENTS], ['UPDATE'])
+
+    def test_ingredient_replacement(self):
+        ingredients = self.current_ingredients()
+        ingredients[0]['id'] = self.ingredients[5].id
+        self.patch({'ingredients': ingredients}, 20)
+        self.assertEqual(
+            self.writes[self.INGREDIENTS], ['DELETE', 'INSERT']
+        )
+        self.assertCountEqual(self.current_ingredients(), ingredients)
+
+    def test_tag_removal(self):
+        response = self.patch({'tags': [self.tags[0].id]}, 13)
+        self.assertEqual(self.writes[self.TAGS], ['DELETE'])
+        self.assertEqual(self.writes[self.INGREDIENTS], [])
+        self.assertEqual(
+            [tag['id'] for tag in response.data['tags']], [self.tags[0].id]
+        )
+
+
+class IngredientValidationTest(RecipeAPITestCase):
+    def rows(self):
+        return sorted(IngredientInRecipe.objects.values_list(
+            'recipe', 'ingredient', 'amount'
+        ))
+
+    def test_duplicate_and_unknown_ingredients(self):
+        recipe = self.recipes[1]
+        self.client.force_authenticate(recipe.author)
+        first, second = self.ingredients[:2]
+        rows = self.rows()
+        for ingredients, error in (
+            (
+                [{'id': first.id, 'amount': 1}, {'id': first.id, 'amount': 2}],
+                'Ингредиенты не должны повторяться.'
+            ),
+            (
+                [{'id': second.id, 'amount': 1}, {'id': 0, 'amount': 2}],
+                'Ингредиенты не найдены: 0.'
+            ),
+        ):
+            for method, url in (
+                ('post', '/api/recipes/'),
+                ('patch', f'/api/recipes/{recipe.id}/'),
+            ):
+                with self.subTest(method=method, error=error):
+                    with CaptureQueriesContext(connection) as context:
+                        response = getattr(self.client, method)(url, {
+                            'name': 'Новый рецепт',
+                            'text': 'Описание',
+                            'cooking_time': 5,
+                            'image': GIF_URI,
+                            'tags': [self.tags[0].id],
+                            'ingredients': ingredients
+                        }, format='json')
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.data['ingredients'], [error])
+                    self.assertFalse([
+                        query for query in context.captured_queries
+                        if query['sql'].startswith(
+                            ('INSERT', 'UPDATE', 'DELETE')
+                        )
+                    ])
+                    self.assertEqual(Recipe.objects.count(), 12)
+                    self.assertEqual(self.rows(), rows)
+
+
+class RelationCounterTest(RecipeAPITestCase):
+    def test_remove_is_a_single_delete(self):
+        recipe = self.recipes[0]
+        with CaptureQueriesContext(connection) as context:
+            removed = Favorite.objects.remove(self.user, (recipe.id,))
+        self.assertEqual(removed, 1)
+        statements = [
+            query['sql'].split()[0] for query in context.captured_queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+        ]
+        self.assertEqual(statements, ['DELETE', 'UPDATE'])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+
+    def test_counters_follow_queryset_and_orm_changes(self):
+        author = self.authors[1]
+        recipe = self.recipes[4]
+        Subscribe.objects.add(self.user, (author.id,))
+        Favorite.objects.add(self.user, (recipe.id,))
+        ShoppingCart.objects.create(user=self.authors[2], recipe=recipe)
+        author.refresh_from_db()
+        recipe.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 1)
+        self.assertEqual(
+            (recipe.favorites_count, recipe.carts_count), (1, 1)
+        )
+        self.user.delete()
+        ShoppingCart.objects.filter(recipe=recipe).delete()
+        author.refresh_from_db()
+        recipe.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 0)
+        self.assertEqual(
+            (recipe.favorites_count, recipe.carts_count), (0, 0)
+        )
+
+    def test_deleted_target_skips_its_counter(self):
+        recipe = self.recipes[0]
+        Favorite.objects.add(self.authors[1], (recipe.id,))
+        ShoppingCart.objects.add(self.authors[2], (recipe.id,))
+        with CaptureQueriesContext(connection) as context:
+            recipe.delete()
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'favorites_count' in query['sql']
+            or 'carts_count' in query['sql']
+        ])
+
+    def test_patch_keeps_counters_changed_after_load(self):
+        recipe = self.recipes[4]
+        get_object = RecipeViewSet.get_object
+
+        def load_then_favorite(view):
+            instance = get_object(view)
+            Favorite.objects.add(self.user, (recipe.id,))
+            return instance
+
+        self.client.force_authenticate(recipe.author)
+        with mock.patch.object(
+            RecipeViewSet, 'get_object', load_then_favorite
+        ):
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/', {'text': 'Новое описание'},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.text, 'Новое описание')
+
+    def test_user_save_keeps_subscribers_count(self):
+        author = User.objects.get(pk=self.authors[1].pk)
+        Subscribe.objects.add(self.user, (author.id,))
+        author.first_name = 'Новое имя'
+        author.save()
+        author.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 1)
+        self.assertEqual(author.first_name, 'Новое имя')
+
+
+class FeedTest(RecipeAPITestCase):
+    def feed(self):
+        ids = []
+        url = '/api/recipes/feed/?limit=5'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def feeds(self):
+        with override_settings(FEED_STRATEGY='join'):
+            join = self.feed()
+        timeline = self.feed()
+        self.assertEqual(join, timeline)
+        return timeline
+
+    def expected(self):
+        return list(
+            Recipe.objects
+            .filter(author__subscribing__user=self.user)
+            .order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+
+    @override_settings(FEED_STRATEGY='timeline')
+    def test_strategies_agree(self):
+        FeedItem.objects.rebuild()
+        self.assertEqual(self.feeds(), self.expected())
+        author = self.authors[1]
+        self.client.post(f'/api/users/{author.id}/subscribe/')
+        self.client.force_authenticate(author)
+        response = self.client.post('/api/recipes/', {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': GIF_URI,
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}]
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.client.force_authenticate(self.user)
+        feed = self.feeds()
+        self.assertEqual(feed[0], response.data['id'])
+        self.assertEqual(feed, self.expected())
+
+    @override_settings(FEED_STRATEGY='timeline')
+    def test_unsubscribe_removes_feed_items(self):
+        FeedItem.objects.rebuild()
+        author = self.authors[0]
+        self.assertTrue(FeedItem.objects.filter(user=self.user).exists())
+        response = self.client.delete(f'/api/users/{author.id}/subscribe/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(FeedItem.objects.filter(user=self.user).exists())
+        self.assertEqual(self.feeds(), [])
+
+    @override_settings(FEED_STRATEGY='timeline')
+    def test_recipe_deletion_removes_feed_items(self):
+        FeedItem.objects.rebuild()
+        recipe = self.recipes[0]
+        self.client.force_authenticate(recipe.author)
+        response = self.client.delete(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(FeedItem.objects.filter(recipe=recipe.id).exists())
+        self.client.force_authenticate(self.user)
+        self.assertNotIn(recipe.id, self.feeds())
+        self.assertEqual(self.feeds(), self.expected())
+
+
+class RecipeSearchTest(RecipeAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        tomato = Ingredient.objects.create(name='Томат', measurement_unit='г')
+        cls.found = []
+        for name, text, ingredients in (
+            ('Томат фаршированный', 'Описание', ()),
+            ('Салат', 'Описание', (tomato,)),
+            ('Паста', 'Добавьте томат в конце', ()),
+        ):
+            recipe = Recipe.objects.create(
+                author=cls.authors[0],
+                name=name,
+                text=text,
+                cooking_time=10,
+                image=SimpleUploadedFile('recipe.gif', GIF, 'image/gif')
+            )
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+                for ingredient in ingredients
+            )
+            cls.found.append(recipe.id)
+        recipe_search.rebuild()
+
+    def search(self, query):
+        response = self.client.get(
+            '/api/recipes/', {'search': query, 'limit': 100}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_ranking(self):
+        self.assertEqual(self.search('томат'), self.found)
+        self.assertEqual(self.search('ТОМАТ'), self.found)
+
+    def test_query_without_words(self):
+        self.assertEqual(self.search('!!!'), [])
+        self.assertEqual(
+            len(self.search('')), Recipe.objects.count()
+        )
+
+    def test_reindex_after_save_and_delete(self):
+        recipe = self.recipes[0]
+        self.client.force_authenticate(recipe.author)
+        self.assertEqual(self.search('томат'), self.found)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                f'/api/recipes/{recipe.id}/', {'text': 'Томат'}, format='json'
+            )
+        self.assertEqual(self.search('томат'), [*self.found, recipe.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/recipes/{self.found[0]}/')
+        self.assertEqual(self.search('томат'), [*self.found[1:], recipe.id])
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT count(*) FROM recipes_recipe_fts WHERE rowid = %s',
+                    (self.found[0],)
+                )
+                self.assertEqual(cursor.fetchone(), (0,))
+
+    def test_cache_is_invalidated_after_reindex(self):
+        calls = mock.Mock()
+        with mock.patch(
+            'api.signals.invalidate', calls.invalidate
+        ), mock.patch.object(
+            recipe_search, 'update', calls.update
+        ), self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].save()
+        names = [name for name, *_ in calls.mock_calls]
+        self.assertIn('update', names)
+        self.assertEqual(names[-1], 'invalidate')
+        self.assertEqual(calls.mock_calls[-1].args, (Recipe,))
+
+
+class ToggleTest(RecipeAPITestCase):
+    def request(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json')
+        statements = [
+            query['sql'].split()[0] for query in context.captured_queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+        ]
+        return response, statements
+
+    def counts(self, recipe):
+        recipe.refresh_from_db()
+        return recipe.favorites_count, recipe.carts_count
+
+    def test_favorite_toggle(self):
+        recipe = self.recipes[2]
+        url = f'/api/recipes/{recipe.id}/favorite/'
+        response, statements = self.request('post', url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(statements[:2], ['INSERT', 'UPDATE'])
+        self.assertEqual(self.counts(recipe), (1, 0))
+        response, statements = self.request('post', url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(statements[0], 'INSERT')
+        self.assertNotIn('UPDATE', statements)
+        self.assertEqual(self.counts(recipe), (1, 0))
+        response, statements = self.request('delete', url)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(statements, ['DELETE', 'UPDATE'])
+        self.assertEqual(self.counts(recipe), (0, 0))
+        response, statements = self.request('delete', url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(statements, ['DELETE'])
+        self.assertEqual(self.counts(recipe), (0, 0))
+
+    @mock.patch('api.views.invalidate_user')
+    def test_flags_are_invalidated_on_commit(self, invalidate):
+        recipe = self.recipes[2].id
+        bulk = {'recipes': [recipe]}
+        for method, url, data, status in (
+            ('post', f'/api/recipes/{recipe}/favorite/', None, 201),
+            ('delete', f'/api/recipes/{recipe}/favorite/', None, 204),
+            ('post', f'/api/recipes/{recipe}/shopping_cart/', None, 201),
+            ('delete', f'/api/recipes/{recipe}/shopping_cart/', None, 204),
+            ('post', '/api/recipes/favorite/', bulk, 201),
+            ('delete', '/api/recipes/favorite/', bulk, 204),
+        ):
+            with self.subTest(method=method, url=url):
+                invalidate.reset_mock()
+                with self.captureOnCommitCallbacks(execute=True):
+                    response, _ = self.request(method, url, data)
+                    self.assertEqual(response.status_code, status)
+                    invalidate.assert_not_called()
+                invalidate.assert_called_once_with(self.user)
+
+    def test_favorite_bulk(self):
+        url = '/api/recipes/favorite/'
+        recipes = [self.recipes[0].id, self.recipes[2].id, self.recipes[3].id]
+        response, statements = self.request('post', url, {'recipes': recipes})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'recipes': sorted(recipes[1:])})
+        self.assertEqual(statements, ['INSERT', 'UPDATE'])
+        response, statements = self.request('post', url, {'recipes': recipes})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'recipes': []})
+        self.assertEqual(statements, ['INSERT'])
+        self.assertEqual(
+            [self.counts(recipe)[0] for recipe in self.recipes[:4]],
+            [1, 0, 1, 1]
+        )
+        response, statements = self.request(
+            'delete', url, {'recipes': recipes}
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(statements, ['DELETE', 'UPDATE'])
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+        response, statements = self.request(
+            'delete', url, {'recipes': recipes}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(statements, ['DELETE'])
+        self.assertEqual(
+            [self.counts(recipe)[0] for recipe in self.recipes[:4]],
+            [0, 0, 0, 0]
+        )
+
+    def test_cart_toggle(self):
+        recipe = self.recipes[4]
+        url = f'/api/recipes/{recipe.id}/shopping_cart/'
+        self.assertEqual(self.request('post', url)[0].status_code, 201)
+        self.assertEqual(self.request('post', url)[0].status_code, 400)
+        self.assertEqual(self.counts(recipe), (0, 1))
+        self.assertEqual(self.request('delete', url)[0].status_code, 204)
+        self.assertEqual(self.request('delete', url)[0].status_code, 400)
+        self.assertEqual(self.counts(recipe), (0, 0))
+
+    def test_subscribe_toggle(self):
+        author = self.authors[1]
+        url = f'/api/users/{author.id}/subscribe/'
+        self.assertEqual(self.request('post', url)[0].status_code, 201)
+        self.assertEqual(self.request('post', url)[0].status_code, 400)
+        author.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 1)
+        response, statements = self.request('delete', url)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(statements[:2], ['DELETE', 'UPDATE'])
+        self.assertEqual(self.request('delete', url)[0].status_code, 400)
+        author.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 0)
+
+
+class SimilarRecipesTest(RecipeAPITestCase):
+    def build(self, *args):
+        stdout = StringIO()
+        call_command(
+            'build_neighbors', '--neighbors=3', '--chunk-size=4', *args,
+            stdout=stdout
+        )
+        return stdout.getvalue()
+
+    def neighbors(self):
+        return [
+            (recipe.id, list(Recipe.objects.similar_to(recipe).values_list(
+                'id', flat=True
+            )))
+            for recipe in Recipe.objects.order_by('id')
+        ]
+
+    def test_incremental_build_matches_full_rebuild(self):
+        self.build()
+        self.assertFalse(
+            Recipe.objects.filter(neighbors_outdated=True).exists()
+        )
+        changed = self.recipes[5]
+        IngredientInRecipe.objects.filter(recipe=changed).delete()
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=changed, ingredient=ingredient, amount=1)
+            for ingredient in self.ingredients[3:]
+        )
+        changed.save()
+        self.recipes[7].delete()
+        output = self.build()
+        self.assertNotIn('Пересчитано рецептов: 11,', output)
+        incremental = self.neighbors()
+        self.build('--full')
+        self.assertEqual(incremental, self.neighbors())
+        self.assertFalse(
+            Recipe.objects.filter(neighbors_outdated=True).exists()
+        )
+
+    def test_similar_follows_scores(self):
+        self.build()
+        recipe = self.recipes[0]
+        response = self.client.get(f'/api/recipes/{recipe.id}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in response.data],
+            list(
+                RecipeNeighbor.objects.filter(recipe=recipe)
+                .order_by('-score', 'neighbor')
+                .values_list('neighbor', flat=True)
+            )
+        )
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(
+            set(response.data[0]),
+            {'id', 'name', 'image', 'image_variants', 'cooking_time'}
+        )
+
+    def test_similar_without_neighbors(self):
+        response = self.client.get(
+            f'/api/recipes/{self.recipes[0].id}/similar/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+        response = self.client.get('/api/recipes/0/similar/')
+        self.assertEqual(response.status_code, 404)
+
+
+class RecommendationsTest(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        recipes = [recipe.id for recipe in self.recipes]
+        Favorite.objects.add(self.authors[0], (recipes[0], recipes[2]))
+        Favorite.objects.add(self.authors[1], (recipes[0], recipes[3]))
+        ShoppingCart.objects.add(self.authors[1], (recipes[4],))
+        self.build()
+
+    def build(self):
+        call_command(
+            'build_recommendations', '--chunk-size=2', stdout=StringIO()
+        )
+
+    def recommended(self, limit=6):
+        response = self.client.get(f'/api/recipes/recommended/?limit={limit}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def popular(self, limit=6):
+        return list(
+            Recipe.objects.popular().values_list('id', flat=True)[:limit]
+        )
+
+    def test_recommendations_skip_seen_recipes(self):
+        recommended = self.recommended()
+        self.assertCountEqual(
+            recommended, [recipe.id for recipe in self.recipes[2:5]]
+        )
+        self.assertEqual(
+            recommended,
+            list(
+                Recipe.objects.recommended(self.user)
+                .values_list('id', flat=True)
+            )
+        )
+
+    def test_cold_start_falls_back_to_popular(self):
+        self.assertFalse(
+            Recommendation.objects.filter(user=self.authors[2]).exists()
+        )
+        self.client.force_authenticate(self.authors[2])
+        self.assertEqual(self.recommended(), self.popular())
+        self.client.force_authenticate(None)
+        self.assertEqual(self.recommended(), self.popular())
+
+    def test_rebuild_drops_users_without_interactions(self):
+        Favorite.objects.filter(user=self.user).delete()
+        ShoppingCart.objects.filter(user=self.user).delete()
+        self.build()
+        self.assertFalse(
+            Recommendation.objects.filter(user=self.user).exists()
+        )
+        self.assertEqual(self.recommended(), self.popular())
+
+
+class AsyncParityTest(RecipeAPITestCase):
+    URLS = (
+        'recipes/?limit=5',
+        'recipes/?limit=5&page=2',
+        'recipes/?is_favorited=1',
+        'recipes/?tags=tag1&author={author}',
+        'recipes/{recipe}/',
+        'tags/',
+        'tags/{tag}/',
+        'ingredients/',
+        'ingredients/?name=ингр',
+        'ingredients/{ingredient}/',
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[0])
+
+    def get(self, prefix, url):
+        cache.clear()
+        response = self.client.get(prefix + url.format(
+            author=self.authors[0].id,
+            recipe=self.recipes[0].id,
+            tag=self.tags[1].id,
+            ingredient=self.ingredients[2].id
+        ))
+        self.assertEqual(response.status_code, 200)
+        return json.loads(
+            response.content.decode().replace('/api/async/', '/api/')
+        )
+
+    def assert_parity(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.get('/api/async/', url), self.get('/api/', url)
+                )
+
+    def test_anonymous(self):
+        self.assert_parity()
+
+    def test_authenticated(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        recipe = self.get('/api/async/', 'recipes/{recipe}/')
+        self.assertEqual(
+            (
+                recipe['is_favorited'],
+                recipe['is_in_shopping_cart'],
+                recipe['author']['is_subscribed']
+            ),
+            (True, True, True)
+        )
+        self.assert_parity()
+
+
+class QueryPlanTest(RecipeAPITestCase):
+    def test_endpoints_use_indexes(self):
+        stdout = StringIO()
+        call_command('check_query_plans', verbosity=2, stdout=stdout)
+        output = stdout.getvalue()
+        for name in (
+            '/api/recipes/:', '/api/recipes/?search=:',
+            '/api/users/subscriptions/:',
+            '/api/recipes/download_shopping_cart/:',
+        ):
+            self.assertIn(name, output)
+        self.assertIn('Все запросы используют индексы.', output)
+
+    def test_full_scan_fails(self):
+        stderr = StringIO()
+        with mock.patch(
+            'api.management.commands.check_query_plans.Command'
+            '.get_querysets',
+            return_value=[
+                ('/api/test/', Recipe.objects.filter(text='x').order_by())
+            ]
+        ), self.assertRaisesMessage(
+            CommandError, 'Полное чтение таблиц: /api/test/'
+        ):
+            call_command('check_query_plans', stderr=stderr)
+        self.assertIn('recipes_recipe', stderr.getvalue())
+
+
+class BulkImportTest(TestCase):
+    PUB_DATE = '2023-03-31T18:03:25.421000+00:00'
+
+    def test_timestamps_survive_import(self):
+        fixture = [
+            {
+                'model': 'users.user',
+                'pk': 1,
+                'fields': {
+                    'username': 'author',
+                    'email': 'author@example.com',
+                    'first_name': 'Автор',
+                    'last_name': 'Рецептов',
+                    'password': '',
+                    'date_joined': '2023-03-31T10:35:39.717Z'
+                }
+            },
+            {
+                'model': 'recipes.recipe',
+                'pk': 1,
+                'fields': {
+                    'name': 'Рецепт',
+                    'text': 'Описание',
+                    'author': 1,
+                    'pub_date': self.PUB_DATE,
+                    'image': 'images/recipe.jpg',
+                    'cooking_time': 10,
+                    'tags': []
+                }
+            }
+        ]
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.json', encoding='utf-8'
+        ) as file:
+            json.dump(fixture, file)
+            file.flush()
+            for _ in range(2):
+                call_command('bulk_import', file.name, stdout=StringIO())
+                self.assertEqual(
+                    Recipe.objects.get(pk=1).pub_date.isoformat(),
+                    self.PUB_DATE
+                )
+
+
+class IngredientIndexTest(TestCase):
+    def test_snapshot_follows_changes_from_other_processes(self):
+        index = IngredientIndex()
+        Ingredient.objects.create(name='Сахар', measurement_unit='г')
+        self.assertEqual(len(index.search('сах')), 1)
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Сахарная пудра', measurement_unit='г')]
+        )
+        self.assertEqual(len(index.search('сах')), 1)
+        invalidate(Ingredient)
+        self.assertEqual(len(index.search('сах')), 2)
+
+    def test_search_ranking(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in (
+                'Тростниковый сахар', 'Сахарная пудра', 'Соль',
+                'Ванильный сахар', 'Сахар', 'Сахар ванильный', 'Сыр',
+            )
+        )
+        index = IngredientIndex()
+
+        def search(query, limit=None):
+            return [
+                ingredient.name for ingredient in index.search(query, limit)
+            ]
+
+        ranked = [
+            'Сахар', 'Сахар ванильный', 'Сахарная пудра',
+            'Ванильный сахар', 'Тростниковый сахар',
+        ]
+        for query in ('сахар', 'САХАР', ' Сахар '):
+            with self.subTest(query=query):
+                self.assertEqual(search(query), ranked)
+        self.assertEqual(search('сахар', 2), ranked[:2])
+        self.assertEqual(search('сахар', 4), ranked[:4])
+        self.assertEqual(search('ванильный'), [
+            'Ванильный сахар', 'Сахар ванильный'
+        ])
+        for query in ('сахр', 'СахР'):
+            with self.subTest(query=query):
+                self.assertEqual(search(query), ['Сахар'])
+        self.assertEqual(search(''), [])
+
+
+class RecipeMatchTest(RecipeAPITestCase):
+    QUERIES = ((0,), (0, 1), (1, 3), (0, 1, 2, 3, 4, 5), (5,))
+
+    def assertParity(self, index):
+        for positions in self.QUERIES:
+            ingredients = [self.ingredients[i].id for i in positions]
+            for max_missing in (None, 0, 1, 2):
+                with self.subTest(
+                    ingredients=positions, max_missing=max_missing
+                ):
+                    self.assertEqual(
+                        index.match(ingredients, max_missing),
+                        list(SqlRecipeMatch().match(ingredients, max_missing))
+                    )
+
+    def test_index_matches_sql(self):
+        self.assertParity(RecipeIngredientIndex())
+
+    def test_snapshot_follows_changes_from_other_processes(self):
+        index, other = RecipeIngredientIndex(), RecipeIngredientIndex()
+        self.assertParity(index)
+        recipe = self.recipes[0]
+        IngredientInRecipe.objects.bulk_create([
+            IngredientInRecipe(
+                recipe=recipe, ingredient=self.ingredients[5], amount=1
+            )
+        ])
+        IngredientInRecipe.objects.filter(
+            recipe=self.recipes[4], ingredient=self.ingredients[0]
+        ).delete()
+        self.assertNotIn(
+            recipe.id,
+            [match[0] for match in index.match([self.ingredients[5].id])]
+        )
+        other.update([recipe.id, self.recipes[4].id])
+        self.assertParity(index)
+        Recipe.objects.filter(pk=self.recipes[1].id).delete()
+        other.delete([self.recipes[1].id])
+        self.assertParity(index)
+        with override_settings(RECIPE_MATCH_MAX_PATCH=0):
+            IngredientInRecipe.objects.filter(recipe=self.recipes[2]).delete()
+            other.update([self.recipes[2].id])
+            self.assertParity(index)
+
+    def test_snapshot_rebuilds_after_counter_eviction(self):
+        index, other = RecipeIngredientIndex(), RecipeIngredientIndex()
+        self.assertParity(index)
+        for position, evicted in (
+            (0, lambda: CHANGES_KEY.format(cache.get(GENERATION_KEY))),
+            (4, lambda: GENERATION_KEY),
+        ):
+            key = evicted()
+            with self.subTest(key=key):
+                recipe = self.recipes[position]
+                cache.delete(key)
+                IngredientInRecipe.objects.filter(recipe=recipe).delete()
+                other.update([recipe.id])
+                self.assertEqual(
+                    other.get_state()[1], index.snapshot['number']
+                )
+                self.assertParity(index)
+                self.assertNotIn(recipe.id, index.snapshot['recipes'])
+
+
+class CacheInvalidationTest(TestCase):
+    def test_versions_change_on_commit(self):
+        for model, create in (
+            (Tag, lambda: Tag.objects.create(
+                name='Завтрак', color='#000000', slug='breakfast'
+            )),
+            (User, lambda: User.objects.create_user(
+                username='user', email='user@example.com', password='x'
+            )),
+        ):
+            with self.subTest(model=model):
+                version = get_version((model,))
+                with self.captureOnCommitCallbacks() as callbacks:
+                    create()
+                    self.assertEqual(get_version((model,)), version)
+                for callback in callbacks:
+                    callback()
+                self.assertNotEqual(get_version((model,)), version)
+
+
+class IngredientSearchCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Ingredient.objects.create(name='Сахар', measurement_unit='г')
+
+    def test_search_is_cached_and_invalidated(self):
+        response = self.client.get('/api/ingredients/', {'name': 'сах'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ingredients/', {'name': 'сах'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(
+            self.client.get(
+                '/api/ingredients/', {'name': 'сах'},
+                HTTP_IF_NONE_MATCH=response['ETag']
+            ).status_code,
+            304
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(
+                name='Сахарная пудра', measurement_unit='г'
+            )
+        response = self.client.get('/api/ingredients/', {'name': 'сах'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data), 2)
+
+
+class CursorPaginationTest(RecipeAPITestCase):
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([recipe['id'] for recipe in response.data['results']])
+            cursor = parse_qs(urlparse(url).query).get('cursor', [''])[0]
+            self.assertNotIn('o=', base64.b64decode(cursor).decode())
+            url = response.data[link]
+        return pages, response
+
+    def test_pages_through_equal_timestamps(self):
+        Recipe.objects.update(pub_date=self.recipes[0].pub_date)
+        pages, response = self.walk('/api/recipes/?cursor=&limit=5', 'next')
+        self.assertEqual(
+            sum(pages, []),
+            sorted((recipe.id for recipe in self.recipes), reverse=True)
+        )
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        previous, _ = self.walk(response.data['previous'], 'previous')
+        self.assertEqual(previous, pages[-2::-1])
+
+    def test_invalid_cursor(self):
+        for position in ('x', '[1]', '["x", "y"]'):
+            with self.subTest(position=position):
+                cursor = base64.b64encode(f'p={position}'.encode()).decode()
+                response = self.client.get(
+                    '/api/recipes/', {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+
+    def test_conflicting_parameters_are_rejected(self):
+        for params in ({'ordering': 'pub_date'}, {'search': 'Рецепт'}):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    '/api/recipes/', {'cursor': '', **params}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.data)
+
+
+class RecipeJSONParserTest(TestCase):
+    def parse(self, payload, chunk_size=64 * 1024):
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload).encode()
+        with mock.patch('api.parsers.CHUNK_SIZE', chunk_size):
+            return RecipeJSONParser().parse(io.BytesIO(payload))
+
+    def assertImage(self, file, content=GIF):
+        self.assertIsInstance(file, TemporaryUploadedFile)
+        self.assertEqual(file.size, len(content))
+        self.assertEqual(file.read(), content)
+        file.close()
+
+    def test_base64_split_across_chunks(self):
+        for chunk_size in (1, 2, 3, 5, 7, 64):
+            with self.subTest(chunk_size=chunk_size):
+                data = self.parse({'image': GIF_URI, 'name': 'Рецепт'})
+                self.assertEqual(data['name'], 'Рецепт')
+                self.assertImage(data['image'])
+
+    def test_short_payload_without_header_end(self):
+        self.assertImage(
+            self.parse({'image': 'data:image/gif;base64,QUJD'})['image'],
+            b'ABC'
+        )
+        self.assertImage(self.parse({'image': 'QUJD'})['image'], b'ABC')
+
+    def test_escaped_strings(self):
+        name = 'Рецепт "image": \\ \\"'
+        payload = json.dumps({
+            'name': name,
+            'text': 'a\\"image\\":"b',
+            'image': GIF_URI
+        }).replace('/', '\\/').encode()
+        for chunk_size in (1, 3, 64):
+            with self.subTest(chunk_size=chunk_size):
+                data = self.parse(payload, chunk_size)
+                self.assertEqual(data['name'], name)
+                self.assertEqual(data['text'], 'a\\"image\\":"b')
+                self.assertImage(data['image'])
+
+    def test_nested_image_keys_are_left_alone(self):
+        payload = {
+            'ingredients': [{'id': 1, 'image': 'QUJD'}],
+            'meta': {'image': {'image': 'QUJD'}},
+            'image': GIF_URI
+        }
+        for chunk_size in (1, 64):
+            with self.subTest(chunk_size=chunk_size):
+                data = self.parse(payload, chunk_size)
+                self.assertEqual(data['ingredients'], payload['ingredients'])
+                self.assertEqual(data['meta'], payload['meta'])
+                self.assertImage(data['image'])
+        self.assertEqual(
+            self.parse({'meta': {'image': 'QUJD'}}),
+            {'meta': {'image': 'QUJD'}}
+        )
+
+    @override_settings(IMAGE_MAX_SIZE=10)
+    def test_oversize_payload_is_not_written(self):
+        file = self.parse({'image': GIF_URI})['image']
+        self.assertEqual(file.size, len(GIF))
+        self.assertEqual(file.read(), b'')
+        file.close()
+
+    def test_invalid_base64(self):
+        for image in ('data:image/gif;base64,QUJD@@@@', 'data:image/gif,Q'):
+            with self.subTest(image=image):
+                file = self.parse({'image': image})['image']
+                self.assertEqual(file.size, 0)
+                file.close()
+
+    def test_non_data_uri_string(self):
+        file = self.parse({'image': 'not an image!'})['image']
+        self.assertEqual(file.size, 0)
+        file.close()
+
+    def test_files_are_closed_on_errors(self):
+        with mock.patch.object(
+            TemporaryUploadedFile,
+            'close',
+            autospec=True,
+            side_effect=TemporaryUploadedFile.close
+        ) as close:
+            with self.assertRaises(ParseError):
+                self.parse(b'{"image": "' + GIF_URI.encode() + b'", }')
+            self.assertEqual(close.call_count, 1)
+            self.parse(
+                b'{"image": "' + GIF_URI.encode() + b'", "image": null}'
+            )
+            self.assertEqual(close.call_count, 2)
+
+
+class RecipeImageUploadTest(RecipeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[1]
+        self.client.force_authenticate(self.recipe.author)
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def test_uploaded_file_is_closed_with_the_request(self):
+        with mock.patch.object(
+            TemporaryUploadedFile,
+            'close',
+            autospec=True,
+            side_effect=TemporaryUploadedFile.close
+        ) as close:
+            response = self.client.patch(
+                self.url, {'image': GIF_URI}, format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(close.call_count, 1)
+
+    def test_rejected_images(self):
+        for image in ('data:image/gif;base64,@@@@', 'not an image!'):
+            with self.subTest(image=image):
+                response = self.client.patch(
+                    self.url, {'image': image}, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.data)
+
+    @override_settings(IMAGE_MAX_SIZE=10)
+    def test_oversize_image_is_rejected(self):
+        response = self.client.patch(
+            self.url, {'image': GIF_URI}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+
+@mock.patch('api.images.connection')
+class ImageVariantsTest(RecipeAPITestCase):
+    def test_failed_build_is_logged(self, connection):
+        recipe = self.recipes[0]
+        with mock.patch(
+            'api.images.render', side_effect=OSError('broken image')
+        ), self.assertLogs('api.images', 'ERROR') as logs:
+            self.assertIsNone(build_variants_task(recipe.id))
+        self.assertIn(
+            f'Failed to build image variants for recipe {recipe.id}',
+            logs.output[0]
+        )
+        self.assertIn('OSError: broken image', logs.output[0])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, {})
+
+    def test_build_stores_variants(self, connection):
+        recipe = self.recipes[0]
+        variants = build_variants_task(recipe.id)
+        connection.close.assert_called_once_with()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, variants)
+        self.assertEqual(set(variants), set(settings.IMAGE_VARIANTS))
+
+    def test_patch_keeps_variants_built_after_load(self, connection):
+        recipe = self.recipes[2]
+        variants = {'thumbnail': 'recipes/variants/thumbnail.webp'}
+        get_object = RecipeViewSet.get_object
+
+        def load_then_build(view):
+            instance = get_object(view)
+            Recipe.objects.filter(pk=recipe.pk).update(
+                image_variants=variants
+            )
+            return instance
+
+        self.client.force_authenticate(recipe.author)
+        with mock.patch.object(RecipeViewSet, 'get_object', load_then_build):
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/', {'name': 'Новое название'},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, variants)
+        self.assertEqual(recipe.name, 'Новое название')
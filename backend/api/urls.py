@@ -1,7 +1,15 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from . import async_views
+from .views import (
+    CacheStatsView,
+    IngredientViewSet,
+    MetricsView,
+    RecipeViewSet,
+    TagViewSet,
+    UserViewSet
+)
 
 router = DefaultRouter()
 
@@ -10,7 +18,19 @@ router.register(r'ingredients', IngredientViewSet)
 router.register(r'recipes', RecipeViewSet)
 router.register(r'users', UserViewSet)
 
+async_urlpatterns = [
+    path('recipes/', async_views.recipe_list),
+    path('recipes/<int:pk>/', async_views.recipe_detail),
+    path('tags/', async_views.tag_list),
+    path('tags/<int:pk>/', async_views.tag_detail),
+    path('ingredients/', async_views.ingredient_list),
+    path('ingredients/<int:pk>/', async_views.ingredient_detail),
+]
+
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
+    path('cache/stats/', CacheStatsView.as_view()),
+    path('metrics/', MetricsView.as_view()),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
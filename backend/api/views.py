@@ -1,46 +1,109 @@
-from django.db import IntegrityError
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Count,
+    F,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value
+)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .filters import IngredientSearch, RecipeFilter
-from .pagination import Paginator
+from .autocomplete import ingredient_search
+from .cache import (
+    CachedRecipeListMixin,
+    CachedResponseMixin,
+    get_stats,
+    invalidate_user
+)
+from .filters import RecipeFilter
+from .metrics import MetricsMixin, registry
+from .pagination import CursorPaginator, PagePaginator, Paginator
+from .pantry import recipe_match
+from .parsers import RecipeJSONParser
 from .permissions import IsAuthorOrAdminOrReadOnly
+from .renderers import SHOPPING_CART_RENDERERS, MetricsRenderer
 from recipes.models import (
     Favorite,
+    FeedItem,
     Ingredient,
-    IngredientInRecipe,
     Recipe,
+    Recommendation,
     ShoppingCart,
+    ShoppingListItem,
     Tag
 )
 from .serializers import (
     IngredientSerializer,
+    RecipeIdsSerializer,
+    RecipeMatchQuerySerializer,
+    RecipeMatchSerializer,
     RecipeMinifiedSerializer,
     RecipeReadSerializer,
     RecipeWriteSerializer,
+    SubscriptionsQuerySerializer,
     TagSerializer,
     UserWithRecipesSerializer
 )
 from users.models import Subscribe, User
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(MetricsMixin, DjoserUserViewSet):
     pagination_class = Paginator
+    cursor_ordering = ('-id',)
+    query_budget = {
+        'list': 7,
+        'retrieve': 3,
+        'me': 2,
+        'subscriptions': 4,
+        'subscribe': 10,
+    }
     http_method_names = ('get', 'post')
 
+    @staticmethod
+    def get_subscriptions_queryset(request):
+        serializer = SubscriptionsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        recipes = Recipe.objects.all()
+        recipes_limit = serializer.validated_data.get('recipes_limit')
+        if recipes_limit is not None:
+            recipes = recipes.filter(
+                pk__in=Subquery(
+                    Recipe.objects
+                    .filter(author=OuterRef('author'))
+                    .values('pk')[:recipes_limit]
+                )
+            )
+        return (
+            User.objects
+            .filter(subscribing__user=request.user)
+            .annotate(
+                recipes_count=Count('recipes'),
+                is_subscribed=Value(True)
+            )
+            .prefetch_related(
+                Prefetch('recipes', queryset=recipes, to_attr='limited')
+            )
+            .order_by('-id')
+        )
+
     @action(
         http_method_names=('post', 'delete'),
         methods=('POST', 'DELETE'),
         detail=True,
         permission_classes=(IsAuthenticated,)
     )
+    @transaction.atomic
     def subscribe(self, request, id):
         user = request.user
         if request.method == 'POST':
@@ -51,25 +114,30 @@ class UserViewSet(DjoserUserViewSet):
                 context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            try:
-                Subscribe.objects.create(user=user, author=author)
-            except IntegrityError:
+            subscriptions = self.get_subscriptions_queryset(request)
+            if not Subscribe.objects.add(user, (author.id,)):
                 return Response(
                     {'errors': 'Вы уже подписаны на автора.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            FeedItem.objects.follow(user, (author.id,))
+            transaction.on_commit(lambda: invalidate_user(user))
+            serializer = UserWithRecipesSerializer(
+                subscriptions.get(id=author.id),
+                context={'request': request}
+            )
             return Response(
                 serializer.data,
                 status=status.HTTP_201_CREATED
             )
 
-        subscription = Subscribe.objects.filter(user=user, author__id=id)
-        if not subscription.exists():
+        if not Subscribe.objects.remove(user, (id,)):
             return Response(
                 {'errors': 'Подписка не найдена.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        subscription.delete()
+        FeedItem.objects.unfollow(user, (id,))
+        transaction.on_commit(lambda: invalidate_user(user))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -77,7 +145,7 @@ class UserViewSet(DjoserUserViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscribing__user=request.user)
+        queryset = self.get_subscriptions_queryset(request)
         page = self.paginate_queryset(queryset)
         serializer = UserWithRecipesSerializer(
             page,
@@ -87,53 +155,132 @@ class UserViewSet(DjoserUserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(
+    MetricsMixin,
+    CachedResponseMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_models = (Tag,)
+    query_budget = 2
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    MetricsMixin,
+    CachedResponseMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (IngredientSearch,)
-    search_fields = ('^name',)
+    cache_models = (Ingredient,)
+    query_budget = 2
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('name'):
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(self.search, request, *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        limit = request.query_params.get('limit', '')
+        serializer = self.get_serializer(
+            ingredient_search.search(
+                request.query_params['name'],
+                int(limit) if limit.isdigit() and int(limit) else None
+            ),
+            many=True
+        )
+        return Response(serializer.data)
+
+
+class CacheStatsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_stats())
+
+
+class MetricsView(APIView):
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (MetricsRenderer,)
+
+    def get(self, request):
+        return Response(
+            registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    MetricsMixin,
+    CachedRecipeListMixin,
+    viewsets.ModelViewSet
+):
     queryset = Recipe.objects.all()
+    lookup_value_regex = r'\d+'
     pagination_class = Paginator
+    cursor_ordering = ('-pub_date', '-id')
+    cursor_conflicts = ('ordering', 'search')
+    feed_ordering = ('-feed_date', '-id')
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    parser_classes = (RecipeJSONParser, MultiPartParser, FormParser)
     http_method_names = ('get', 'post', 'patch', 'delete',)
+    cache_models = (Recipe, Tag, Ingredient, User)
+    uncached_params = ('ordering',)
+    query_budget = {
+        'list': 9,
+        'retrieve': 6,
+        'create': 16,
+        'partial_update': 23,
+        'destroy': 20,
+        'favorite': 6,
+        'favorite_bulk': 5,
+        'shopping_cart': 13,
+        'download_shopping_cart': 2,
+        'feed': 6,
+        'similar': 3,
+        'recommended': 8,
+        'cookable': 7,
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        user = self.request.user
+        return queryset.with_related(user).with_user_flags(user)
 
     def get_serializer_class(self):
+        if self.action == 'cookable':
+            return RecipeMatchSerializer
+        if self.action == 'similar':
+            return RecipeMinifiedSerializer
         if self.request.method == 'GET':
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
     @staticmethod
     def add_to_list(model, user, pk):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        try:
-            model.objects.create(user=user, recipe=recipe)
-        except IntegrityError:
+        if not model.objects.add(user, (pk,)):
+            get_object_or_404(Recipe, pk=pk)
             return Response(
                 {'errors': 'Дублирование добавления.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        serializer = RecipeMinifiedSerializer(recipe)
+        transaction.on_commit(lambda: invalidate_user(user))
+        serializer = RecipeMinifiedSerializer(Recipe.objects.get(pk=pk))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
     def delete_from_list(model, user, pk):
-        instance = model.objects.filter(user=user, recipe__id=pk)
-        if not instance.exists():
+        if not model.objects.remove(user, (pk,)):
             return Response(
                 {'errors': 'Рецепт отсутствует в списке.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        instance.delete()
+        transaction.on_commit(lambda: invalidate_user(user))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -146,35 +293,145 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.add_to_list(Favorite, request.user, pk)
         return self.delete_from_list(Favorite, request.user, pk)
 
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_bulk(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            added = Favorite.objects.add(request.user, recipes)
+            if not added:
+                return Response({'recipes': []}, status=status.HTTP_200_OK)
+            transaction.on_commit(lambda: invalidate_user(request.user))
+            return Response(
+                {'recipes': sorted(added)},
+                status=status.HTTP_201_CREATED
+            )
+        if not Favorite.objects.remove(request.user, recipes):
+            return Response(
+                {'errors': 'Рецепты отсутствуют в списке.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        transaction.on_commit(lambda: invalidate_user(request.user))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(
         methods=['POST', 'DELETE'],
         detail=True,
         permission_classes=(IsAuthenticated,)
     )
+    @transaction.atomic
     def shopping_cart(self, request, pk):
         if request.method == 'POST':
-            return self.add_to_list(ShoppingCart, request.user, pk)
-        return self.delete_from_list(ShoppingCart, request.user, pk)
+            response = self.add_to_list(ShoppingCart, request.user, pk)
+            if response.status_code == status.HTTP_201_CREATED:
+                ShoppingListItem.objects.add_recipe(request.user, pk)
+            return response
+        response = self.delete_from_list(ShoppingCart, request.user, pk)
+        if response.status_code == status.HTTP_204_NO_CONTENT:
+            ShoppingListItem.objects.remove_recipe(request.user, pk)
+        return response
 
     @action(
         detail=False,
         permission_classes=(IsAuthenticated,)
     )
+    def feed(self, request):
+        user = request.user
+        paginator = CursorPaginator(self.feed_ordering)
+        page = paginator.paginate_queryset(
+            Recipe.objects
+            .feed(user)
+            .with_related(user)
+            .with_user_flags(user),
+            request,
+            self
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk):
+        recipes = list(Recipe.objects.similar_to(pk))
+        if not recipes:
+            get_object_or_404(Recipe, pk=pk)
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False)
+    def recommended(self, request):
+        user = request.user
+        recipes = Recipe.objects.popular()
+        if (
+            user.is_authenticated
+            and Recommendation.objects.filter(user=user).exists()
+        ):
+            recipes = Recipe.objects.recommended(user)
+        paginator = PagePaginator()
+        page = paginator.paginate_queryset(
+            recipes.with_related(user).with_user_flags(user),
+            request,
+            self
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def cookable(self, request):
+        serializer = RecipeMatchQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        paginator = PagePaginator()
+        page = paginator.paginate_queryset(
+            recipe_match.match(**serializer.validated_data),
+            request,
+            self
+        )
+        user = request.user
+        recipes = (
+            Recipe.objects
+            .with_related(user)
+            .with_user_flags(user)
+            .in_bulk([recipe for recipe, *_ in page])
+        )
+        matches = []
+        for recipe, missing, total in page:
+            if recipe not in recipes:
+                continue
+            recipe = recipes[recipe]
+            recipe.missing_count = missing
+            recipe.coverage = round((total - missing) / total * 100, 1)
+            matches.append(recipe)
+        serializer = self.get_serializer(matches, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_CART_RENDERERS
+    )
     def download_shopping_cart(self, request):
         ingredients = (
-            IngredientInRecipe.objects
-            .filter(recipe__shopping__user=request.user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(amount=Sum('amount'))
-        )
-        shopping_cart = [f'Список покупок {request.user}.\n']
-        for ingredient in ingredients:
-            shopping_cart.append(
-                f'{ingredient["ingredient__name"]} - '
-                f'{ingredient["amount"]} '
-                f'{ingredient["ingredient__measurement_unit"]}\n'
+            ShoppingListItem.objects
+            .filter(user=request.user)
+            .values(
+                'ingredient__name',
+                'ingredient__measurement_unit',
+                amount=F('total_amount')
             )
-        file = f'{request.user}_shopping_cart.txt'
-        response = HttpResponse(shopping_cart, content_type='text/plain')
+            .order_by('ingredient__name', 'ingredient__measurement_unit')
+            .iterator(chunk_size=settings.SHOPPING_CART_CHUNK_SIZE)
+        )
+        renderer = request.accepted_renderer
+        file = f'{request.user}_shopping_cart.{renderer.format}'
+        response = StreamingHttpResponse(
+            renderer.stream(request.user, ingredients),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
         response['Content-Disposition'] = f'attachment; filename={file}'
         return response
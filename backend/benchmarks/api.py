@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from itertools import cycle
+from urllib.parse import quote, urlencode
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from . import dataset  # noqa: E402
+from .load import run, summarize  # noqa: E402
+from recipes.models import Ingredient, Tag  # noqa: E402
+
+SCENARIOS = (
+    'feed',
+    'recipe_detail',
+    'subscriptions',
+    'ingredient_search',
+    'download_shopping_cart',
+)
+
+
+def get_scenarios(variants, seed):
+    rng = random.Random(seed)
+    slugs = list(Tag.objects.order_by('slug').values_list('slug', flat=True))
+    recipe_ids = list(
+        dataset.bench_recipes().order_by('id').values_list('id', flat=True)
+    )
+    names = list(
+        Ingredient.objects.order_by('id').values_list('name', flat=True)
+    )
+    return {
+        'feed': [
+            '/api/recipes/?' + urlencode(
+                [('tags', slug) for slug in rng.sample(slugs, 2)]
+                + [('page', rng.randint(1, 5))]
+            )
+            for _ in range(variants)
+        ],
+        'recipe_detail': [
+            f'/api/recipes/{recipe}/'
+            for recipe in rng.sample(recipe_ids, variants)
+        ],
+        'subscriptions': [
+            f'/api/users/subscriptions/?page={page}&recipes_limit=3'
+            for page in range(1, 3)
+        ],
+        'ingredient_search': [
+            f'/api/ingredients/?name={quote(name[:3])}'
+            for name in rng.sample(names, variants)
+        ],
+        'download_shopping_cart': ['/api/recipes/download_shopping_cart/'],
+    }
+
+
+def get_host():
+    return next(
+        (host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'),
+        'testserver'
+    )
+
+
+def run_in_process(urls, requests, token):
+    client = Client(HTTP_AUTHORIZATION=f'Token {token}', HTTP_HOST=get_host())
+    urls = cycle(urls)
+    latencies, queries = [], []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = client.get(next(urls))
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            errors += 1
+            continue
+        latencies.append(elapsed)
+        queries.append(len(context))
+    return summarize(
+        latencies, time.perf_counter() - started, errors, queries
+    )
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(args):
+    user = dataset.bench_users().order_by('id').first()
+    if user is None:
+        raise SystemExit(
+            'Нет данных для нагрузки, выполните: python -m benchmarks.api seed'
+        )
+    token = Token.objects.get_or_create(user=user)[0].key
+    scenarios = get_scenarios(args.variants, args.seed)
+    if args.scenario:
+        scenarios = {name: scenarios[name] for name in args.scenario}
+    report = {
+        'commit': get_commit(),
+        'dataset': dataset.stats(),
+        'requests': args.requests,
+        'in_process': {
+            name: run_in_process(urls, args.requests, token)
+            for name, urls in scenarios.items()
+        },
+    }
+    if args.base_url:
+        report['concurrency'] = args.concurrency
+        report['http'] = {
+            name: asyncio.run(run(
+                [args.base_url.rstrip('/') + url for url in urls],
+                args.concurrency,
+                args.requests,
+                {'Authorization': f'Token {token}'}
+            ))
+            for name, urls in scenarios.items()
+        }
+    return report
+
+
+def compare(args):
+    with open(args.baseline, encoding='utf-8') as file:
+        baseline = json.load(file)
+    with open(args.current, encoding='utf-8') as file:
+        current = json.load(file)
+    changes = {}
+    for mode in ('in_process', 'http'):
+        for name, after in current.get(mode, {}).items():
+            before = baseline.get(mode, {}).get(name)
+            if before is None:
+                continue
+            changes.setdefault(mode, {})[name] = {
+                metric: {
+                    'before': before[metric],
+                    'after': after[metric],
+                    'change_percent': round(
+                        (after[metric] - before[metric])
+                        / before[metric] * 100, 1
+                    ),
+                }
+                for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'rps',
+                               'queries_mean')
+                if before.get(metric) and after.get(metric) is not None
+            }
+    return {
+        'baseline': baseline.get('commit'),
+        'current': current.get('commit'),
+        'changes': changes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Нагрузочное тестирование основных эндпоинтов API.'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    seed = commands.add_parser(
+        'seed',
+        help='Создает синтетический набор данных (пересоздает прежний).'
+    )
+    seed.add_argument('--users', type=int, default=1000)
+    seed.add_argument('--recipes', type=int, default=5000)
+    seed.add_argument('--ingredients-per-recipe', type=int, default=8)
+    seed.add_argument('--favorites', type=int, default=20,
+                      help='Избранных рецептов на пользователя.')
+    seed.add_argument('--carts', type=int, default=5,
+                      help='Рецептов в корзине на пользователя.')
+    seed.add_argument('--subscriptions', type=int, default=10,
+                      help='Подписок на пользователя.')
+    seed.add_argument('--seed', type=int, default=0)
+    seed.add_argument('--batch-size', type=int, default=1000)
+    commands.add_parser('reset', help='Удаляет синтетический набор данных.')
+    bench = commands.add_parser(
+        'run',
+        help='Прогоняет сценарии через тестовый клиент и, при указании '
+             '--base-url, по HTTP.'
+    )
+    bench.add_argument('--requests', type=int, default=200,
+                       help='Запросов на сценарий.')
+    bench.add_argument('--variants', type=int, default=20,
+                       help='Различных URL на сценарий.')
+    bench.add_argument('--scenario', action='append',
+                       choices=SCENARIOS)
+    bench.add_argument('--base-url', help='Адрес запущенного сервера.')
+    bench.add_argument('--concurrency', type=int, default=20)
+    bench.add_argument('--seed', type=int, default=0)
+    bench.add_argument('--output', help='Файл для JSON-отчета.')
+    diff = commands.add_parser('compare', help='Сравнивает два отчета.')
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    args = parser.parse_args()
+    if args.command == 'seed':
+        report = dataset.seed(
+            users=args.users,
+            recipes=args.recipes,
+            ingredients_per_recipe=args.ingredients_per_recipe,
+            favorites=args.favorites,
+            carts=args.carts,
+            subscriptions=args.subscriptions,
+            seed=args.seed,
+            batch_size=args.batch_size
+        )
+    elif args.command == 'reset':
+        dataset.reset()
+        report = dataset.stats()
+    elif args.command == 'run':
+        report = benchmark(args)
+    else:
+        report = compare(args)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if getattr(args, 'output', None):
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import argparse
+import asyncio
+import json
+
+from .load import run
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            'Сравнивает синхронный и асинхронный пути чтения API '
+            'под нагрузкой медленных клиентов.'
+        )
+    )
+    parser.add_argument(
+        '--target',
+        action='append',
+        required=True,
+        metavar='NAME=URL',
+        help='Именованный URL для нагрузки, можно указать несколько раз.'
+    )
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument(
+        '--slow',
+        type=float,
+        default=0,
+        help='Задержка в секундах между строкой запроса и заголовками.'
+    )
+    parser.add_argument('--token', help='Токен для авторизованных запросов.')
+    args = parser.parse_args()
+    headers = {'Authorization': f'Token {args.token}'} if args.token else {}
+    report = {
+        'concurrency': args.concurrency,
+        'slow': args.slow,
+        'targets': {},
+    }
+    for target in args.target:
+        name, url = target.split('=', 1)
+        report['targets'][name] = asyncio.run(run(
+            url, args.concurrency, args.requests, headers, args.slow
+        ))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
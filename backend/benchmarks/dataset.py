@@ -0,0 +1,167 @@
+import io
+import random
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import transaction
+from PIL import Image
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag
+)
+from recipes.signals import bulk_imported
+from users.models import Subscribe, User
+
+PREFIX = 'bench_'
+IMAGE = 'recipes/images/bench.png'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F1B51C', 'dessert'),
+    ('Выпечка', '#B0703E', 'bakery'),
+    ('Суп', '#3D9DD6', 'soup'),
+    ('Салат', '#7BC043', 'salad'),
+    ('Напиток', '#D64A7D', 'drink'),
+)
+
+
+def batched(objects, size):
+    objects = iter(objects)
+    while batch := list(islice(objects, size)):
+        yield batch
+
+
+def bench_users():
+    return User.objects.filter(username__startswith=PREFIX)
+
+
+def bench_recipes():
+    return Recipe.objects.filter(author__username__startswith=PREFIX)
+
+
+def reset():
+    bench_users().delete()
+    call_command('rebuild_shopping_list', stdout=io.StringIO())
+
+
+def save_image():
+    storage = Recipe._meta.get_field('image').storage
+    if not storage.exists(IMAGE):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), '#E26C2D').save(buffer, 'PNG')
+        storage.save(IMAGE, ContentFile(buffer.getvalue()))
+
+
+def insert(model, objects, batch_size):
+    for batch in batched(objects, batch_size):
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def pairs(rng, users, targets, per_user):
+    for user in users:
+        for target in rng.sample(targets, min(per_user, len(targets))):
+            yield user, target
+
+
+@transaction.atomic
+def seed(
+    users=1000,
+    recipes=5000,
+    ingredients_per_recipe=8,
+    favorites=20,
+    carts=5,
+    subscriptions=10,
+    seed=0,
+    batch_size=1000
+):
+    rng = random.Random(seed)
+    reset()
+    call_command('load_ingredients', stdout=io.StringIO())
+    for name, color, slug in TAGS:
+        Tag.objects.get_or_create(
+            slug=slug, defaults={'name': name, 'color': color}
+        )
+    save_image()
+    password = make_password(PREFIX)
+    insert(User, (
+        User(
+            username=f'{PREFIX}{number}',
+            email=f'{PREFIX}{number}@example.com',
+            first_name='Бенчмарк',
+            last_name=str(number),
+            password=password
+        )
+        for number in range(users)
+    ), batch_size)
+    user_ids = list(bench_users().order_by('id').values_list('id', flat=True))
+    insert(Recipe, (
+        Recipe(
+            name=f'Рецепт {number}',
+            text='Синтетический рецепт для нагрузочного тестирования.',
+            author_id=rng.choice(user_ids),
+            image=IMAGE,
+            cooking_time=rng.randint(1, 180)
+        )
+        for number in range(recipes)
+    ), batch_size)
+    recipe_ids = list(
+        bench_recipes().order_by('id').values_list('id', flat=True)
+    )
+    ingredient_ids = list(
+        Ingredient.objects.order_by('id').values_list('id', flat=True)
+    )
+    tag_ids = list(Tag.objects.order_by('id').values_list('id', flat=True))
+    insert(Recipe.tags.through, (
+        Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+        for recipe in recipe_ids
+        for tag in rng.sample(tag_ids, rng.randint(1, 3))
+    ), batch_size)
+    insert(IngredientInRecipe, (
+        IngredientInRecipe(
+            recipe_id=recipe,
+            ingredient_id=ingredient,
+            amount=rng.randint(1, 500)
+        )
+        for recipe in recipe_ids
+        for ingredient in rng.sample(ingredient_ids, ingredients_per_recipe)
+    ), batch_size)
+    insert(Favorite, (
+        Favorite(user_id=user, recipe_id=recipe)
+        for user, recipe in pairs(rng, user_ids, recipe_ids, favorites)
+    ), batch_size)
+    insert(ShoppingCart, (
+        ShoppingCart(user_id=user, recipe_id=recipe)
+        for user, recipe in pairs(rng, user_ids, recipe_ids, carts)
+    ), batch_size)
+    insert(Subscribe, (
+        Subscribe(user_id=user, author_id=author)
+        for user, author in pairs(rng, user_ids, user_ids, subscriptions)
+        if user != author
+    ), batch_size)
+    call_command('rebuild_shopping_list', stdout=io.StringIO())
+    call_command('reconcile_counters', stdout=io.StringIO())
+    for model in (Ingredient, Tag, User, Recipe):
+        transaction.on_commit(
+            lambda model=model: bulk_imported.send(sender=model)
+        )
+    return stats()
+
+
+def stats():
+    users = bench_users()
+    return {
+        'users': users.count(),
+        'recipes': bench_recipes().count(),
+        'ingredients': Ingredient.objects.count(),
+        'favorites': Favorite.objects.filter(user__in=users).count(),
+        'carts': ShoppingCart.objects.filter(user__in=users).count(),
+        'subscriptions': Subscribe.objects.filter(user__in=users).count(),
+    }
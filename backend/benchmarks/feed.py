@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import time
+from datetime import timedelta
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from .api import get_host  # noqa: E402
+from .dataset import IMAGE, insert, save_image  # noqa: E402
+from .load import percentile  # noqa: E402
+from recipes.models import FeedItem, Recipe  # noqa: E402
+from users.models import Subscribe, User  # noqa: E402
+
+PREFIX = 'feedbench_'
+STRATEGIES = ('join', 'timeline')
+
+
+def create_users(name, count, batch_size):
+    password = make_password(PREFIX)
+    insert(User, (
+        User(
+            username=f'{PREFIX}{name}_{number}',
+            email=f'{PREFIX}{name}_{number}@example.com',
+            first_name='Бенчмарк',
+            last_name=name,
+            password=password
+        )
+        for number in range(count)
+    ), batch_size)
+    return list(
+        User.objects
+        .filter(username__startswith=f'{PREFIX}{name}_')
+        .order_by('id')
+    )
+
+
+def create_recipes(authors, per_author, batch_size):
+    now = timezone.now()
+    insert(Recipe, (
+        Recipe(
+            name=f'Рецепт {number}',
+            text='Синтетический рецепт для ленты подписок.',
+            author=author,
+            image=IMAGE,
+            cooking_time=10
+        )
+        for author in authors
+        for number in range(per_author)
+    ), batch_size)
+    recipes = list(Recipe.objects.filter(author__in=authors).order_by('id'))
+    for number, recipe in enumerate(recipes):
+        recipe.pub_date = now - timedelta(minutes=number)
+    Recipe.objects.bulk_update(recipes, ('pub_date',), batch_size=batch_size)
+
+
+def median(timings):
+    return round(percentile(timings, 50) * 1000, 2)
+
+
+def measure_publish(followers, repeat, batch_size):
+    author, = create_users(f'author{followers}', 1, batch_size)
+    insert(Subscribe, (
+        Subscribe(user=follower, author=author)
+        for follower in create_users(f'follower{followers}', followers,
+                                     batch_size)
+    ), batch_size)
+    result = {'followers': followers}
+    for strategy in STRATEGIES:
+        timings = []
+        with override_settings(FEED_STRATEGY=strategy):
+            for number in range(repeat):
+                start = time.perf_counter()
+                with transaction.atomic():
+                    recipe = Recipe.objects.create(
+                        name=f'{strategy} {number}',
+                        text='Новый рецепт.',
+                        author=author,
+                        image=IMAGE,
+                        cooking_time=10
+                    )
+                    FeedItem.objects.publish(recipe)
+                timings.append(time.perf_counter() - start)
+        result[f'{strategy}_ms'] = median(timings)
+    return result
+
+
+def measure_read(following, per_author, repeat, batch_size):
+    reader, = create_users(f'reader{following}', 1, batch_size)
+    authors = create_users(f'followed{following}', following, batch_size)
+    create_recipes(authors, per_author, batch_size)
+    insert(Subscribe, (
+        Subscribe(user=reader, author=author) for author in authors
+    ), batch_size)
+    with override_settings(FEED_STRATEGY='timeline'):
+        FeedItem.objects.follow(reader, [author.pk for author in authors])
+    client = Client(
+        HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=reader).key}',
+        HTTP_HOST=get_host()
+    )
+    result = {'following': following, 'recipes': following * per_author}
+    for strategy in STRATEGIES:
+        timings = []
+        with override_settings(FEED_STRATEGY=strategy):
+            url = '/api/recipes/feed/'
+            for _ in range(repeat):
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append(time.perf_counter() - start)
+                url = response.json()['next'] or '/api/recipes/feed/'
+        result[f'{strategy}_ms'] = median(timings)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            'Сравнивает ленту подписок на чтении (join) и на записи '
+            '(timeline) в зависимости от числа подписчиков и подписок. '
+            'Данные создаются в транзакции и откатываются.'
+        )
+    )
+    parser.add_argument(
+        '--followers',
+        type=int,
+        nargs='+',
+        default=[10, 100, 1000, 10000],
+        help='Число подписчиков автора при публикации рецепта.'
+    )
+    parser.add_argument(
+        '--following',
+        type=int,
+        nargs='+',
+        default=[10, 100, 1000],
+        help='Число авторов, на которых подписан читатель ленты.'
+    )
+    parser.add_argument('--recipes-per-author', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    save_image()
+    report = {}
+    with transaction.atomic():
+        report['publish'] = [
+            measure_publish(followers, args.repeat, args.batch_size)
+            for followers in args.followers
+        ]
+        report['read'] = [
+            measure_read(
+                following,
+                args.recipes_per_author,
+                args.repeat,
+                args.batch_size
+            )
+            for following in args.following
+        ]
+        transaction.set_rollback(True)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import asyncio
+import math
+import re
+import time
+from itertools import cycle
+from urllib.parse import urlsplit
+
+QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
+
+
+def summarize(latencies, elapsed, errors=0, queries=None):
+    summary = {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        **{
+            f'p{percent}_ms': (
+                round(percentile(latencies, percent) * 1000, 2)
+                if latencies else None
+            )
+            for percent in (50, 95, 99)
+        },
+    }
+    if queries:
+        summary['queries_mean'] = round(sum(queries) / len(queries), 1)
+        summary['queries_max'] = max(queries)
+    return summary
+
+
+async def fetch(url, headers=None, slow=0):
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, parts.port or 80
+    )
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\n'.encode())
+        await writer.drain()
+        if slow:
+            await asyncio.sleep(slow)
+        lines = [f'Host: {parts.netloc}', 'Connection: close'] + [
+            f'{name}: {value}' for name, value in (headers or {}).items()
+        ]
+        writer.write(''.join(f'{line}\r\n' for line in lines).encode())
+        writer.write(b'\r\n')
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while (line := await reader.readline()).strip():
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        await reader.read()
+        return status, headers
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def run(urls, concurrency, requests, headers=None, slow=0):
+    urls = cycle([urls] if isinstance(urls, str) else urls)
+    latencies = []
+    queries = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                status, response_headers = await fetch(
+                    next(urls), headers, slow
+                )
+            except OSError:
+                status = None
+            if status != 200:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            match = QUERIES.search(response_headers.get('server-timing', ''))
+            if match:
+                queries.append(int(match.group(1)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors, queries)
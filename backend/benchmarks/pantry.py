@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import random
+import time
+import tracemalloc
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from .load import percentile  # noqa: E402
+from api.pantry import RecipeIngredientIndex, SqlRecipeMatch  # noqa: E402
+from recipes.models import Ingredient, IngredientInRecipe  # noqa: E402
+
+
+def median(timings):
+    return round(percentile(timings, 50) * 1000, 2)
+
+
+def measure(backend, pantries, max_missing):
+    timings, results = [], []
+    for pantry in pantries:
+        start = time.perf_counter()
+        matches = backend.match(pantry, max_missing)
+        page = list(matches[:settings.PAGE_SIZE])
+        count = len(matches)
+        timings.append(time.perf_counter() - start)
+        results.append((count, page))
+    return timings, results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            'Сравнивает подбор рецептов по имеющимся ингредиентам через '
+            'индекс в памяти и через агрегацию в БД.'
+        )
+    )
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[3, 10, 30],
+        help='Число ингредиентов в запросе.'
+    )
+    parser.add_argument('--max-missing', type=int)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    ingredients = list(
+        Ingredient.objects
+        .filter(ingredientinrecipe__isnull=False)
+        .distinct()
+        .values_list('id', flat=True)
+    )
+    if not ingredients:
+        raise SystemExit(
+            'Нет данных, выполните: python -m benchmarks.api seed'
+        )
+    index = RecipeIngredientIndex()
+    tracemalloc.start()
+    start = time.perf_counter()
+    index.get_snapshot()
+    build = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    report = {
+        'rows': IngredientInRecipe.objects.count(),
+        'index_build_ms': round(build * 1000, 2),
+        'index_memory_mb': round(memory / 2 ** 20, 2),
+        'sizes': [],
+    }
+    for size in args.sizes:
+        pantries = [
+            rng.sample(ingredients, min(size, len(ingredients)))
+            for _ in range(args.repeat)
+        ]
+        index_timings, index_results = measure(
+            index, pantries, args.max_missing
+        )
+        sql_timings, sql_results = measure(
+            SqlRecipeMatch(), pantries, args.max_missing
+        )
+        report['sizes'].append({
+            'ingredients': size,
+            'matches_mean': round(
+                sum(count for count, _ in index_results) / len(pantries)
+            ),
+            'index_ms': median(index_timings),
+            'sql_ms': median(sql_timings),
+            'same_results': index_results == sql_results,
+        })
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
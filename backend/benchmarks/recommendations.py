@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+import django
+import numpy as np
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from recipes.management.commands.build_recommendations import (  # noqa: E402
+    interaction_matrix,
+    item_neighbors,
+    recommend
+)
+
+
+def synthetic(favorites, recipes, per_user, cart_share, skew, rng):
+    users = max(favorites // per_user, 1)
+    popularity = 1 / np.arange(1, recipes + 1) ** skew
+    popularity /= popularity.sum()
+    relations = []
+    for count in (favorites, int(favorites * cart_share)):
+        keys = np.unique(
+            rng.integers(0, users, count, dtype=np.int64) * recipes
+            + rng.choice(recipes, count, p=popularity)
+        )
+        relations.append(np.stack((keys // recipes, keys % recipes), axis=1))
+    return zip(relations, (1, settings.RECOMMENDATIONS_CART_WEIGHT))
+
+
+def measure(phase, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = phase(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {
+        'ms': round(elapsed * 1000, 2),
+        'peak_mb': round(peak / 2 ** 20, 2),
+    }
+
+
+def recommend_all(matrix, neighbors, limit, chunk_size):
+    return sum(
+        len(rows)
+        for _, rows, _, _ in recommend(matrix, neighbors, limit, chunk_size)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            'Измеряет время и пиковую память расчета рекомендаций на '
+            'синтетических данных с популярностью рецептов по закону Ципфа.'
+        )
+    )
+    parser.add_argument(
+        '--favorites',
+        type=int,
+        nargs='+',
+        default=[100000, 1000000],
+        help='Число записей в избранном.'
+    )
+    parser.add_argument('--recipes', type=int, default=50000)
+    parser.add_argument(
+        '--per-user',
+        type=int,
+        default=20,
+        help='Среднее число рецептов в избранном пользователя.'
+    )
+    parser.add_argument(
+        '--cart-share',
+        type=float,
+        default=0.2,
+        help='Размер списков покупок относительно избранного.'
+    )
+    parser.add_argument('--skew', type=float, default=1.0)
+    parser.add_argument(
+        '--recommendations', type=int, default=settings.RECOMMENDATIONS
+    )
+    parser.add_argument(
+        '--neighbors',
+        type=int,
+        default=settings.RECOMMENDATIONS_ITEM_NEIGHBORS
+    )
+    parser.add_argument(
+        '--chunk-size', type=int, default=settings.RECOMMENDATIONS_CHUNK_SIZE
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    reports = []
+    for favorites in args.favorites:
+        relations = synthetic(
+            favorites, args.recipes, args.per_user, args.cart_share,
+            args.skew, rng
+        )
+        (user_ids, recipe_ids, matrix), matrix_stats = measure(
+            interaction_matrix, relations
+        )
+        neighbors, neighbors_stats = measure(
+            item_neighbors, matrix, args.neighbors, args.chunk_size
+        )
+        recommendations, recommend_stats = measure(
+            recommend_all, matrix, neighbors, args.recommendations,
+            args.chunk_size
+        )
+        reports.append({
+            'favorites': favorites,
+            'users': len(user_ids),
+            'recipes': len(recipe_ids),
+            'interactions': matrix.nnz,
+            'recommendations': recommendations,
+            'interaction_matrix': matrix_stats,
+            'item_neighbors': neighbors_stats,
+            'recommend': recommend_stats,
+        })
+    print(json.dumps(reports, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import base64
+import io
+import json
+import os
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from PIL import Image  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+
+from api.fields import RecipeImageField  # noqa: E402
+from api.parsers import RecipeJSONParser  # noqa: E402
+
+
+def make_body(size):
+    side = int((size / 3) ** 0.5)
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(
+        buffer, 'PNG'
+    )
+    return json.dumps({
+        'name': 'benchmark',
+        'text': 'benchmark',
+        'cooking_time': 1,
+        'image': 'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode(),
+    }).encode()
+
+
+def upload(parser, body):
+    data = parser.parse(io.BytesIO(body), 'application/json', {})
+    image = RecipeImageField().to_internal_value(data['image'])
+    image.close()
+
+
+def measure(parser, body, concurrency):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(
+            lambda _: upload(parser, body), range(concurrency)
+        ))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'peak_mb': round(peak / 1024 / 1024, 1),
+        'seconds': round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            'Сравнивает пиковое потребление памяти при загрузке '
+            'изображений рецептов обычным и потоковым парсерами JSON.'
+        )
+    )
+    parser.add_argument(
+        '--size',
+        type=float,
+        default=4,
+        help='Размер изображения в мегабайтах.'
+    )
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+    body = make_body(int(args.size * 1024 * 1024))
+    print(json.dumps({
+        'body_mb': round(len(body) / 1024 / 1024, 1),
+        'concurrency': args.concurrency,
+        'json': measure(JSONParser(), body, args.concurrency),
+        'streaming': measure(RecipeJSONParser(), body, args.concurrency),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
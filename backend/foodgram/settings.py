@@ -18,6 +18,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.ApiMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,6 +79,16 @@ DATABASES = {
 #    }
 #}
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -152,3 +164,64 @@ MAX_COOKING_TIME = 360
 MAX_AMOUNT = 3000
 
 PAGE_SIZE = 6
+
+SHOPPING_CART_CHUNK_SIZE = 500
+
+BULK_FAVORITE_LIMIT = 100
+
+API_METRICS_PREFIX = '/api/'
+
+API_METRICS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+
+API_METRICS_QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+IMAGE_MAX_SIZE = 5 * 1024 * 1024
+
+IMAGE_MAX_DIMENSION = 4096
+
+IMAGE_WORKERS = 2
+
+IMAGE_VARIANTS_DIR = 'images/variants'
+
+IMAGE_VARIANTS = {
+    'thumbnail': {'size': (400, 400), 'image_format': 'JPEG', 'quality': 80},
+    'webp': {'size': (1200, 1200), 'image_format': 'WEBP', 'quality': 80},
+}
+
+FEED_STRATEGY = os.getenv('FEED_STRATEGY', 'join')
+
+RECIPE_SEARCH_CONFIG = 'russian'
+
+INGREDIENT_SEARCH_BACKEND = os.getenv(
+    'INGREDIENT_SEARCH_BACKEND',
+    'api.autocomplete.IngredientIndex'
+)
+
+INGREDIENT_SEARCH_SIMILARITY = 0.3
+
+RECIPE_MATCH_BACKEND = os.getenv(
+    'RECIPE_MATCH_BACKEND',
+    'api.pantry.RecipeIngredientIndex'
+)
+
+RECIPE_MATCH_INGREDIENTS_LIMIT = 100
+
+RECIPE_MATCH_MAX_PATCH = 1000
+
+RECIPE_NEIGHBORS = 10
+
+RECIPE_NEIGHBORS_TAG_WEIGHT = 0.5
+
+RECIPE_NEIGHBORS_CHUNK_SIZE = 256
+
+RECOMMENDATIONS = 100
+
+RECOMMENDATIONS_ITEM_NEIGHBORS = 50
+
+RECOMMENDATIONS_CART_WEIGHT = 0.5
+
+RECOMMENDATIONS_CHUNK_SIZE = 256
+
+API_CACHE_TIMEOUT = 60 * 60
@@ -7,6 +7,7 @@ from .models import (
     IngredientInRecipe,
     Recipe,
     ShoppingCart,
+    ShoppingListItem,
     Tag
 )
 
@@ -44,6 +45,7 @@ class RecipeAdmin(admin.ModelAdmin):
         'image',
         'cooking_time',
         'added_to_favorite',
+        'carts_count',
     )
     inlines = (IngredientInRecipeInline,)
     list_filter = (
@@ -57,9 +59,12 @@ class RecipeAdmin(admin.ModelAdmin):
         'tags__name',
     )
 
-    @display(description='Общее число в избранном')
+    @display(
+        description='Общее число в избранном',
+        ordering='favorites_count'
+    )
     def added_to_favorite(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
 
 
 @admin.register(IngredientInRecipe)
@@ -85,3 +90,12 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'user',
         'recipe',
     )
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'ingredient',
+        'total_amount',
+    )
@@ -0,0 +1,18 @@
+from django.contrib.postgres import indexes
+from django.contrib.postgres.indexes import OpClass
+from django.db import models
+
+
+class GinIndex(indexes.GinIndex):
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().create_sql(model, schema_editor, using, **kwargs)
+        return models.Index(
+            *(
+                expression.get_source_expressions()[0]
+                if isinstance(expression, OpClass) else expression
+                for expression in self.expressions
+            ),
+            fields=self.fields,
+            name=self.name
+        ).create_sql(model, schema_editor, **kwargs)
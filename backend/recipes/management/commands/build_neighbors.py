@@ -0,0 +1,174 @@
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+from scipy import sparse
+
+from recipes.matrices import chunks, entries, pairs, top_per_row
+from recipes.models import IngredientInRecipe, Recipe, RecipeNeighbor
+
+
+def features():
+    recipe_ids = np.array(
+        Recipe.objects.order_by('id').values_list('id', flat=True),
+        dtype=np.int64
+    )
+    blocks = []
+    for relations, factor in (
+        (pairs(IngredientInRecipe.objects, 'recipe_id', 'ingredient_id'), 1),
+        (
+            pairs(Recipe.tags.through.objects, 'recipe_id', 'tag_id'),
+            settings.RECIPE_NEIGHBORS_TAG_WEIGHT
+        ),
+    ):
+        values, column = np.unique(relations[:, 1], return_inverse=True)
+        idf = np.log((1 + len(recipe_ids)) / (1 + np.bincount(column))) + 1
+        blocks.append(sparse.csr_matrix(
+            (
+                (idf[column] * factor).astype(np.float32),
+                (np.searchsorted(recipe_ids, relations[:, 0]), column)
+            ),
+            shape=(len(recipe_ids), len(values))
+        ))
+    norms = np.sqrt(sum(
+        np.asarray(block.multiply(block).sum(axis=1)).ravel()
+        for block in blocks
+    ))
+    norms[norms == 0] = 1
+    scale = sparse.diags((1 / norms).astype(np.float32))
+    ingredients, tags = (sparse.csr_matrix(scale @ block) for block in blocks)
+    return recipe_ids, ingredients, tags.toarray()
+
+
+def similarities(ingredients, tags, positions):
+    rows, columns, scores = entries(ingredients[positions] @ ingredients.T)
+    keep = columns != positions[rows]
+    rows, columns = rows[keep], columns[keep]
+    scores = scores[keep] + np.einsum(
+        'ij,ij->i', tags[positions[rows]], tags[columns]
+    )
+    return rows, columns, scores
+
+
+def top_neighbors(ingredients, tags, positions, limit):
+    rows, columns, scores = top_per_row(
+        *similarities(ingredients, tags, positions), limit
+    )
+    return positions[rows], columns, scores
+
+
+def affected(ingredients, tags, recipe_ids, positions, limit, chunk_size):
+    thresholds = np.zeros(len(recipe_ids), dtype=np.float32)
+    for recipe, score, count in (
+        RecipeNeighbor.objects
+        .order_by()
+        .values('recipe')
+        .annotate(score=Min('score'), count=Count('id'))
+        .values_list('recipe', 'score', 'count')
+        .iterator()
+    ):
+        position = np.searchsorted(recipe_ids, recipe)
+        if (
+            count >= limit
+            and position < len(recipe_ids)
+            and recipe_ids[position] == recipe
+        ):
+            thresholds[position] = score
+    found = np.zeros(len(recipe_ids), dtype=bool)
+    found[positions] = True
+    for chunk in chunks(positions, chunk_size):
+        _, columns, scores = similarities(ingredients, tags, chunk)
+        found[columns[scores >= thresholds[columns]]] = True
+    neighbor_of = np.array(
+        RecipeNeighbor.objects
+        .filter(neighbor__in=recipe_ids[positions].tolist())
+        .values_list('recipe', flat=True),
+        dtype=np.int64
+    )
+    found[np.searchsorted(
+        recipe_ids, neighbor_of[np.isin(neighbor_of, recipe_ids)]
+    )] = True
+    return np.flatnonzero(found)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие рецепты (сходство наборов ингредиентов '
+        'и тегов) для измененных рецептов и рецептов, чьи списки '
+        'от этого меняются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Пересчитать все рецепты.'
+        )
+        parser.add_argument(
+            '--neighbors',
+            type=int,
+            default=settings.RECIPE_NEIGHBORS,
+            help='Число похожих рецептов для каждого рецепта.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.RECIPE_NEIGHBORS_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        outdated = Recipe.objects.all()
+        if not options['full']:
+            outdated = outdated.filter(neighbors_outdated=True)
+        with transaction.atomic():
+            changed = np.array(
+                outdated.select_for_update().values_list('id', flat=True),
+                dtype=np.int64
+            )
+            Recipe.objects.filter(
+                pk__in=changed.tolist()
+            ).update(neighbors_outdated=False)
+        try:
+            computed, stored = self.build(changed, options)
+        except BaseException:
+            Recipe.objects.filter(
+                pk__in=changed.tolist()
+            ).update(neighbors_outdated=True)
+            raise
+        return self.style.SUCCESS(
+            f'Пересчитано рецептов: {computed}, похожих: {stored}'
+        )
+
+    def build(self, changed, options):
+        limit, chunk_size = options['neighbors'], options['chunk_size']
+        recipe_ids, ingredients, tags = features()
+        positions = np.searchsorted(
+            recipe_ids, changed[np.isin(changed, recipe_ids)]
+        )
+        if 0 < len(positions) < len(recipe_ids):
+            positions = affected(
+                ingredients, tags, recipe_ids, positions, limit, chunk_size
+            )
+        ids = recipe_ids.tolist()
+        stored = 0
+        for chunk in chunks(positions, chunk_size):
+            neighbors = [
+                RecipeNeighbor(
+                    recipe_id=ids[position],
+                    neighbor_id=ids[column],
+                    score=score
+                )
+                for position, column, score in zip(*(
+                    values.tolist()
+                    for values
+                    in top_neighbors(ingredients, tags, chunk, limit)
+                ))
+            ]
+            with transaction.atomic():
+                RecipeNeighbor.objects.filter(
+                    recipe__in=recipe_ids[chunk].tolist()
+                ).delete()
+                RecipeNeighbor.objects.bulk_create(neighbors)
+            stored += len(neighbors)
+        return len(positions), stored
@@ -0,0 +1,128 @@
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from scipy import sparse
+
+from recipes.matrices import chunks, entries, pairs, top_per_row
+from recipes.models import Favorite, Recommendation, ShoppingCart
+
+
+def interactions():
+    return (
+        (pairs(Favorite.objects, 'user_id', 'recipe_id'), 1),
+        (
+            pairs(ShoppingCart.objects, 'user_id', 'recipe_id'),
+            settings.RECOMMENDATIONS_CART_WEIGHT
+        ),
+    )
+
+
+def interaction_matrix(relations):
+    users, recipes, weights = [], [], []
+    for relation, weight in relations:
+        users.append(relation[:, 0])
+        recipes.append(relation[:, 1])
+        weights.append(np.full(len(relation), weight, dtype=np.float32))
+    user_ids, rows = np.unique(np.concatenate(users), return_inverse=True)
+    recipe_ids, columns = np.unique(
+        np.concatenate(recipes), return_inverse=True
+    )
+    return user_ids, recipe_ids, sparse.csr_matrix(
+        (np.concatenate(weights), (rows, columns)),
+        shape=(len(user_ids), len(recipe_ids))
+    )
+
+
+def item_neighbors(matrix, limit, chunk_size):
+    items = matrix.shape[1]
+    transposed = sparse.csr_matrix(matrix.T)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    found = [(np.array([], dtype=np.int64),) * 2 + (np.array([]),)]
+    for chunk in chunks(np.arange(items), chunk_size):
+        rows, columns, scores = entries(transposed[chunk] @ matrix)
+        keep = columns != chunk[rows]
+        rows, columns = rows[keep], columns[keep]
+        scores = scores[keep] / (norms[chunk[rows]] * norms[columns])
+        rows, columns, scores = top_per_row(rows, columns, scores, limit)
+        found.append((chunk[rows], columns, scores))
+    rows, columns, scores = (np.concatenate(part) for part in zip(*found))
+    return sparse.csr_matrix(
+        (scores.astype(np.float32), (rows, columns)), shape=(items, items)
+    )
+
+
+def recommend(matrix, neighbors, limit, chunk_size):
+    items = matrix.shape[1]
+    for chunk in chunks(np.arange(matrix.shape[0]), chunk_size):
+        seen = matrix[chunk]
+        rows, columns, scores = entries(seen @ neighbors)
+        seen_rows, seen_columns, _ = entries(seen)
+        keep = ~np.isin(
+            rows.astype(np.int64) * items + columns,
+            seen_rows.astype(np.int64) * items + seen_columns
+        )
+        rows, columns, scores = top_per_row(
+            rows[keep], columns[keep], scores[keep], limit
+        )
+        yield chunk, chunk[rows], columns, scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Рассчитывает рекомендации рецептов пользователям по совместной '
+        'встречаемости рецептов в избранном и списках покупок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recommendations',
+            type=int,
+            default=settings.RECOMMENDATIONS,
+            help='Число рекомендаций на пользователя.'
+        )
+        parser.add_argument(
+            '--neighbors',
+            type=int,
+            default=settings.RECOMMENDATIONS_ITEM_NEIGHBORS,
+            help='Число похожих рецептов, учитываемых для каждого рецепта.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.RECOMMENDATIONS_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        user_ids, recipe_ids, matrix = interaction_matrix(interactions())
+        neighbors = item_neighbors(matrix, options['neighbors'], chunk_size)
+        users, recipes = user_ids.tolist(), recipe_ids.tolist()
+        stored = 0
+        for chunk, rows, columns, scores in recommend(
+            matrix, neighbors, options['recommendations'], chunk_size
+        ):
+            recommendations = [
+                Recommendation(
+                    user_id=users[row],
+                    recipe_id=recipes[column],
+                    score=score
+                )
+                for row, column, score
+                in zip(rows.tolist(), columns.tolist(), scores.tolist())
+            ]
+            with transaction.atomic():
+                Recommendation.objects.filter(
+                    user__in=user_ids[chunk].tolist()
+                ).delete()
+                Recommendation.objects.bulk_create(recommendations)
+            stored += len(recommendations)
+        Recommendation.objects.exclude(
+            Exists(Favorite.objects.filter(user=OuterRef('user')))
+        ).exclude(
+            Exists(ShoppingCart.objects.filter(user=OuterRef('user')))
+        ).delete()
+        return self.style.SUCCESS(
+            f'Пользователей: {len(user_ids)}, рекомендаций: {stored}'
+        )
@@ -0,0 +1,142 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from recipes.models import Favorite, IngredientInRecipe, Recipe, ShoppingCart
+from recipes.signals import bulk_imported
+from users.models import Subscribe, User
+
+COUNTED = {Favorite, Recipe, ShoppingCart, Subscribe, User}
+EXCLUDED = ('contenttypes', 'auth.Permission', 'admin', 'sessions')
+
+
+@contextmanager
+def raw_timestamps(model):
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает фикстуры Django пакетными вставками, '
+        'обновляя уже существующие записи.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'fixtures',
+            nargs='+',
+            help='JSON-фикстуры в формате dumpdata.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество объектов в одной вставке.'
+        )
+        parser.add_argument(
+            '-e', '--exclude',
+            action='append',
+            default=[],
+            help='Пропустить приложение (app_label) или модель '
+                 '(app_label.ModelName). Всегда пропускаются служебные '
+                 f'таблицы Django: {", ".join(EXCLUDED)}.'
+        )
+
+    def handle(self, *args, **options):
+        excluded = {
+            apps.get_model(label) if '.' in label
+            else apps.get_app_config(label)
+            for label in (*EXCLUDED, *options['exclude'])
+        }
+        started = time.perf_counter()
+        self.loaded = Counter()
+        with transaction.atomic():
+            for fixture in options['fixtures']:
+                with open(fixture, encoding='utf-8') as file:
+                    self.load(
+                        serializers.deserialize(
+                            'json', file, ignorenonexistent=True
+                        ),
+                        options['batch_size'],
+                        excluded
+                    )
+            statements = connection.ops.sequence_reset_sql(
+                no_style(), list(self.loaded)
+            )
+            if statements:
+                with connection.cursor() as cursor:
+                    for statement in statements:
+                        cursor.execute(statement)
+        elapsed = time.perf_counter() - started
+        for model, count in self.loaded.items():
+            bulk_imported.send(sender=model)
+            self.stdout.write(f'{model._meta.label}: {count}')
+        if self.loaded.keys() & {IngredientInRecipe, ShoppingCart}:
+            call_command('rebuild_shopping_list', stdout=self.stdout)
+        if self.loaded.keys() & COUNTED:
+            call_command('reconcile_counters', stdout=self.stdout)
+        rows = sum(self.loaded.values())
+        return self.style.SUCCESS(
+            f'Загружено объектов: {rows}, {rows / elapsed:.0f} объектов/с'
+        )
+
+    def load(self, objects, batch_size, excluded):
+        model, batch = None, []
+        for deserialized in objects:
+            current = type(deserialized.object)
+            if current in excluded or current._meta.app_config in excluded:
+                continue
+            if current is not model or len(batch) >= batch_size:
+                self.flush(model, batch)
+                model, batch = current, []
+            batch.append(deserialized)
+        self.flush(model, batch)
+
+    def flush(self, model, batch):
+        if not batch:
+            return
+        fields = [
+            field.name for field in model._meta.concrete_fields
+            if not field.primary_key
+        ]
+        with raw_timestamps(model):
+            model._base_manager.bulk_create(
+                [deserialized.object for deserialized in batch],
+                update_conflicts=bool(fields),
+                unique_fields=[model._meta.pk.name],
+                update_fields=fields
+            )
+        for name in batch[0].m2m_data:
+            field = model._meta.get_field(name)
+            through = field.remote_field.through
+            through._base_manager.bulk_create(
+                [
+                    through(**{
+                        f'{field.m2m_field_name()}_id': deserialized.object.pk,
+                        f'{field.m2m_reverse_field_name()}_id': related,
+                    })
+                    for deserialized in batch
+                    for related in deserialized.m2m_data.get(name, ())
+                ],
+                ignore_conflicts=True
+            )
+        self.loaded[model] += len(batch)
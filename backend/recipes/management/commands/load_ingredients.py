@@ -0,0 +1,77 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Ingredient
+from recipes.signals import bulk_imported
+
+
+def read_csv(file):
+    for name, measurement_unit in csv.reader(file):
+        yield name, measurement_unit
+
+
+def read_json(file):
+    for ingredient in json.load(file):
+        yield ingredient['name'], ingredient['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON файлов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            default=[settings.BASE_DIR.parent / 'data' / 'ingredients.csv'],
+            help='Файлы с ингредиентами (.csv или .json).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одной вставке.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        before = Ingredient.objects.count()
+        rows = 0
+        for path in map(Path, options['paths']):
+            reader = READERS.get(path.suffix.lower())
+            if reader is None:
+                raise CommandError(f'Неподдерживаемый формат файла: {path}')
+            with open(path, encoding='utf-8') as file:
+                rows += self.load(reader(file), options['batch_size'])
+        bulk_imported.send(sender=Ingredient)
+        elapsed = time.perf_counter() - started
+        return self.style.SUCCESS(
+            f'Обработано строк: {rows}, '
+            f'добавлено ингредиентов: {Ingredient.objects.count() - before}, '
+            f'{rows / elapsed:.0f} строк/с'
+        )
+
+    @staticmethod
+    def load(rows, batch_size):
+        loaded = 0
+        while batch := list(islice(rows, batch_size)):
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ],
+                ignore_conflicts=True
+            )
+            loaded += len(batch)
+        return loaded
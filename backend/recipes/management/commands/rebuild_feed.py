@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.models import FeedItem
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ленты подписок из подписок и рецептов авторов.'
+
+    def handle(self, *args, **options):
+        if not FeedItem.objects.enabled():
+            self.stderr.write(
+                f'FEED_STRATEGY = {settings.FEED_STRATEGY!r}: ленты '
+                f'заполняются, но не используются до переключения '
+                f'на \'timeline\'.'
+            )
+        return self.style.SUCCESS(
+            f'Записей в лентах: {FeedItem.objects.rebuild()}'
+        )
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает сводные списки покупок из корзин пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить списки покупок с корзинами, ничего не меняя.'
+        )
+
+    def handle(self, *args, **options):
+        expected = {
+            (user, ingredient): total_amount
+            for user, ingredient, total_amount
+            in ShoppingListItem.objects.cart_totals().iterator()
+        }
+        if options['verify']:
+            return self.verify(expected)
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                [
+                    ShoppingListItem(
+                        user_id=user,
+                        ingredient_id=ingredient,
+                        total_amount=total_amount
+                    )
+                    for (user, ingredient), total_amount in expected.items()
+                ],
+                batch_size=1000
+            )
+        return self.style.SUCCESS(
+            f'Позиций в списках покупок: {len(expected)}'
+        )
+
+    def verify(self, expected):
+        actual = {
+            (user, ingredient): total_amount
+            for user, ingredient, total_amount
+            in ShoppingListItem.objects.values_list(
+                'user', 'ingredient', 'total_amount'
+            ).iterator()
+        }
+        mismatches = [
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        for user, ingredient in mismatches[:20]:
+            self.stderr.write(
+                f'Пользователь {user}, ингредиент {ingredient}: '
+                f'ожидается {expected.get((user, ingredient))}, '
+                f'в списке {actual.get((user, ingredient))}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        return self.style.SUCCESS(
+            f'Списки покупок совпадают с корзинами: {len(expected)} позиций'
+        )
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribe, User
+
+COUNTERS = (
+    (Recipe, Favorite),
+    (Recipe, ShoppingCart),
+    (User, Subscribe),
+)
+
+
+def actual_count(relation):
+    field = relation.objects.all().target.name
+    return Coalesce(
+        Subquery(
+            relation.objects
+            .filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики избранного, списков покупок и подписчиков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить счетчики, ничего не меняя.'
+        )
+
+    def handle(self, *args, **options):
+        mismatches = 0
+        with transaction.atomic():
+            for model, relation in COUNTERS:
+                counter = relation.counter
+                stale = (
+                    model.objects
+                    .annotate(actual=actual_count(relation))
+                    .exclude(**{counter: F('actual')})
+                )
+                if options['verify']:
+                    rows = list(stale.values_list('pk', counter, 'actual'))
+                    for pk, value, actual in rows[:20]:
+                        self.stderr.write(
+                            f'{model._meta.verbose_name} {pk}, {counter}: '
+                            f'{value}, ожидается {actual}'
+                        )
+                    mismatches += len(rows)
+                    continue
+                updated = model._base_manager.filter(
+                    pk__in=stale.values('pk')
+                ).update(**{counter: actual_count(relation)})
+                self.stdout.write(
+                    f'{model._meta.label}.{counter}: исправлено {updated}'
+                )
+        if mismatches:
+            raise CommandError(f'Расхождений: {mismatches}')
+        if options['verify']:
+            return self.style.SUCCESS('Счетчики совпадают с данными.')
+        return self.style.SUCCESS('Счетчики пересчитаны.')
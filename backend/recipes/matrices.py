@@ -0,0 +1,29 @@
+import numpy as np
+from scipy import sparse
+
+
+def pairs(queryset, *fields):
+    return np.array(
+        list(queryset.order_by().values_list(*fields).iterator()),
+        dtype=np.int64
+    ).reshape(-1, 2)
+
+
+def chunks(positions, size):
+    for start in range(0, len(positions), size):
+        yield positions[start:start + size]
+
+
+def entries(matrix):
+    matrix = sparse.csr_matrix(matrix)
+    matrix.sort_indices()
+    matrix = matrix.tocoo()
+    return matrix.row, matrix.col, matrix.data
+
+
+def top_per_row(rows, columns, scores, limit):
+    span = np.ptp(scores) + 1 if len(scores) else 1
+    order = np.argsort(rows * span - scores, kind='stable')
+    rows, columns, scores = rows[order], columns[order], scores[order]
+    keep = np.arange(len(rows)) - np.searchsorted(rows, rows) < limit
+    return rows[keep], columns[keep], scores[keep]
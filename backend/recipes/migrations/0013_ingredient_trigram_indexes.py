@@ -0,0 +1,28 @@
+# Generated by Django 4.1.7 on 2026-10-17 16:20
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+import django.db.models.functions.text
+import recipes.indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recommendation'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'DROP INDEX IF EXISTS recipes_ingredient_name_trgm',
+            migrations.RunSQL.noop
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=recipes.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='recipes_ingredient_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=recipes.indexes.GinIndex(django.contrib.postgres.indexes.OpClass('name', name='gin_trgm_ops'), name='ingredient_name_similarity_idx'),
+        ),
+    ]
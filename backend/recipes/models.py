@@ -1,12 +1,22 @@
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Upper
 from django.core.validators import (
     MaxValueValidator,
     MinValueValidator,
     RegexValidator
 )
 
-from users.models import User
+from .indexes import GinIndex
+from users.models import (
+    ManagedFieldsMixin,
+    Subscribe,
+    User,
+    UserRelationQuerySet
+)
 
 
 class Tag(models.Model):
@@ -57,12 +67,85 @@ class Ingredient(models.Model):
                 name='unique_ingredient_unit'
             )
         ]
+        indexes = [
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='recipes_ingredient_name_trgm'
+            ),
+            GinIndex(
+                OpClass('name', name='gin_trgm_ops'),
+                name='ingredient_name_similarity_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self, user):
+        is_subscribed = models.Value(False)
+        if user.is_authenticated:
+            is_subscribed = models.Exists(
+                Subscribe.objects.filter(
+                    user=user,
+                    author=models.OuterRef('pk')
+                )
+            )
+        return self.prefetch_related(
+            models.Prefetch(
+                'author',
+                queryset=User.objects.annotate(is_subscribed=is_subscribed)
+            ),
+            'tags',
+            'ingredientinrecipe__ingredient',
+        )
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(
+                    user=user,
+                    recipe=models.OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(
+                    user=user,
+                    recipe=models.OuterRef('pk')
+                )
+            ),
+        )
+
+    def feed(self, user):
+        if settings.FEED_STRATEGY == 'timeline':
+            return self.filter(feed_items__user=user).annotate(
+                feed_date=models.F('feed_items__pub_date')
+            )
+        return self.filter(author__subscribing__user=user).annotate(
+            feed_date=models.F('pub_date')
+        )
+
+    def similar_to(self, recipe):
+        return self.filter(neighbor_of__recipe=recipe).order_by(
+            '-neighbor_of__score', 'id'
+        )
+
+    def recommended(self, user):
+        return self.filter(recommended_to__user=user).order_by(
+            '-recommended_to__score', '-recommended_to__recipe_id'
+        )
+
+    def popular(self):
+        return self.order_by('-favorites_count', '-pub_date', '-id')
+
+
+class Recipe(ManagedFieldsMixin, models.Model):
     name = models.CharField(
         'Название',
         max_length=settings.DEFAULT_FIELD_LENGTH
@@ -84,6 +167,32 @@ class Recipe(models.Model):
         'Изображение',
         upload_to='images/',
     )
+    image_variants = models.JSONField(
+        'Варианты изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
+    neighbors_outdated = models.BooleanField(
+        'Похожие рецепты устарели',
+        default=True,
+        editable=False
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='IngredientInRecipe',
@@ -113,10 +222,34 @@ class Recipe(models.Model):
         verbose_name='Теги'
     )
 
+    objects = RecipeQuerySet.as_manager()
+    managed_fields = (
+        'image_variants', 'favorites_count', 'carts_count', 'search_vector'
+    )
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=('pub_date', 'id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', 'pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('favorites_count', 'pub_date', 'id'),
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=('id',),
+                condition=models.Q(neighbors_outdated=True),
+                name='recipe_neighbors_outdated_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=('name', 'author'),
@@ -128,6 +261,22 @@ class Recipe(models.Model):
         return self.name
 
 
+class IngredientInRecipeQuerySet(models.QuerySet):
+    def remove(self, recipe, ingredients):
+        if not ingredients:
+            return
+        ops = connections[self.db].ops
+        meta = self.model._meta
+        sql = ' '.join((
+            f'DELETE FROM {ops.quote_name(meta.db_table)}',
+            f'WHERE {ops.quote_name(meta.get_field("recipe").column)} = %s',
+            f'AND {ops.quote_name(meta.get_field("ingredient").column)} IN '
+            f'({", ".join(["%s"] * len(ingredients))})',
+        ))
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, (recipe.pk, *ingredients))
+
+
 class IngredientInRecipe(models.Model):
     recipe = models.ForeignKey(
         Recipe,
@@ -160,6 +309,8 @@ class IngredientInRecipe(models.Model):
         ]
     )
 
+    objects = IngredientInRecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецептах'
@@ -188,6 +339,9 @@ class Favorite(models.Model):
         verbose_name='рецепт'
     )
 
+    objects = UserRelationQuerySet.as_manager()
+    counter = 'favorites_count'
+
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
@@ -216,6 +370,9 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт'
     )
 
+    objects = UserRelationQuerySet.as_manager()
+    counter = 'carts_count'
+
     class Meta:
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзины'
@@ -225,3 +382,294 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart'
             )
         ]
+
+
+class FeedItemQuerySet(models.QuerySet):
+    @staticmethod
+    def enabled():
+        return settings.FEED_STRATEGY == 'timeline'
+
+    def quote(self, model, *fields):
+        ops = connections[self.db].ops
+        return [ops.quote_name(model._meta.db_table)] + [
+            ops.quote_name(model._meta.get_field(field).column)
+            for field in fields
+        ]
+
+    def insert_select(self, select, params):
+        ops = connections[self.db].ops
+        table, *columns = self.quote(self.model, 'user', 'recipe', 'pub_date')
+        sql = ' '.join((
+            ops.insert_statement(on_conflict=OnConflict.IGNORE),
+            f'{table} ({", ".join(columns)})',
+            select,
+            ops.on_conflict_suffix_sql((), OnConflict.IGNORE, None, None),
+        ))
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def publish(self, recipe):
+        if not self.enabled():
+            return 0
+        table, user, author = self.quote(Subscribe, 'user', 'author')
+        pub_date = self.model._meta.get_field('pub_date').get_db_prep_value(
+            recipe.pub_date, connections[self.db]
+        )
+        return self.insert_select(
+            f'SELECT {user}, %s, %s FROM {table} WHERE {author} = %s',
+            (recipe.pk, pub_date, recipe.author_id)
+        )
+
+    def follow(self, user, authors):
+        if not self.enabled() or not authors:
+            return 0
+        table, pk, pub_date, author = self.quote(
+            Recipe, 'id', 'pub_date', 'author'
+        )
+        return self.insert_select(
+            f'SELECT %s, {pk}, {pub_date} FROM {table} '
+            f'WHERE {author} IN ({", ".join(["%s"] * len(authors))})',
+            (user.pk, *authors)
+        )
+
+    def unfollow(self, user, authors):
+        if not self.enabled() or not authors:
+            return 0
+        return self.filter(user=user, recipe__author__in=authors).delete()[0]
+
+    def rebuild(self):
+        subscribe, user, followed = self.quote(Subscribe, 'user', 'author')
+        recipe, pk, pub_date, author = self.quote(
+            Recipe, 'id', 'pub_date', 'author'
+        )
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            return self.insert_select(
+                f'SELECT {subscribe}.{user}, {recipe}.{pk}, '
+                f'{recipe}.{pub_date} FROM {subscribe} JOIN {recipe} '
+                f'ON {recipe}.{author} = {subscribe}.{followed}',
+                ()
+            )
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField(
+        'Дата публикации'
+    )
+
+    objects = FeedItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', 'pub_date', 'recipe'),
+                name='feed_user_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}-{self.recipe}'
+
+
+class RecipeNeighbor(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbors',
+        verbose_name='Рецепт'
+    )
+    neighbor = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbor_of',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(
+        'Сходство'
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'neighbor'),
+                name='unique_recipe_neighbor'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe}-{self.neighbor}'
+
+
+class Recommendation(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='recommended_to',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(
+        'Оценка'
+    )
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_recommendation'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', 'score', 'recipe'),
+                name='recommendation_user_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}-{self.recipe}'
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    def change(self, users, amounts):
+        amounts = {
+            ingredient: amount
+            for ingredient, amount in amounts.items()
+            if amount
+        }
+        if not users or not amounts:
+            return
+        with transaction.atomic(savepoint=False):
+            try:
+                with transaction.atomic():
+                    self.apply(users, amounts)
+            except IntegrityError:
+                self.apply(users, amounts)
+
+    def apply(self, users, amounts):
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.select_for_update().filter(
+                user__in=users,
+                ingredient__in=amounts
+            )
+        }
+        created, updated, deleted = [], [], []
+        for user in users:
+            for ingredient, amount in amounts.items():
+                item = items.get((user, ingredient))
+                if item is None:
+                    if amount > 0:
+                        created.append(self.model(
+                            user_id=user,
+                            ingredient_id=ingredient,
+                            total_amount=amount
+                        ))
+                    continue
+                item.total_amount += amount
+                if item.total_amount > 0:
+                    updated.append(item)
+                else:
+                    deleted.append(item.pk)
+        self.bulk_create(created)
+        self.bulk_update(updated, ('total_amount',))
+        self.filter(pk__in=deleted).delete()
+
+    @staticmethod
+    def cart_totals():
+        return (
+            IngredientInRecipe.objects
+            .filter(recipe__shopping__isnull=False)
+            .values_list('recipe__shopping__user', 'ingredient')
+            .annotate(total_amount=models.Sum('amount'))
+            .order_by()
+        )
+
+    @staticmethod
+    def recipe_amounts(recipe, sign=1):
+        return {
+            ingredient: sign * amount
+            for ingredient, amount in IngredientInRecipe.objects.filter(
+                recipe=recipe
+            ).values_list('ingredient', 'amount')
+        }
+
+    def add_recipe(self, user, recipe):
+        self.change([user.pk], self.recipe_amounts(recipe))
+
+    def remove_recipe(self, user, recipe):
+        self.change([user.pk], self.recipe_amounts(recipe, sign=-1))
+
+    def change_recipe(self, recipe, amounts):
+        if not any(amounts.values()):
+            return
+        self.change(
+            list(
+                ShoppingCart.objects
+                .filter(recipe=recipe)
+                .values_list('user', flat=True)
+            ),
+            amounts
+        )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField(
+        'Общее количество'
+    )
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}-{self.ingredient}'
@@ -12,6 +12,7 @@ class UserAdmin(UserAdmin):
         'first_name',
         'last_name',
         'password',
+        'subscribers_count',
     )
     list_filter = ('username', 'email',)
 
@@ -1,9 +1,30 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.constants import OnConflict
 
+from .signals import relations_changed
 
-class User(AbstractUser):
+
+class ManagedFieldsMixin:
+    managed_fields = ()
+
+    def save(
+        self, force_insert=False, force_update=False, using=None,
+        update_fields=None
+    ):
+        if update_fields is None and not (
+            force_insert or self._state.adding
+        ):
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.managed_fields
+            ]
+        super().save(force_insert, force_update, using, update_fields)
+
+
+class User(ManagedFieldsMixin, AbstractUser):
     email = models.EmailField(
         'Эл. почта',
         max_length=settings.EMAIL_LENGTH,
@@ -23,6 +44,13 @@ class User(AbstractUser):
         'Пароль',
         max_length=settings.USER_FIELD_LENGTH,
     )
+    subscribers_count = models.PositiveIntegerField(
+        'Подписчики',
+        default=0,
+        editable=False
+    )
+
+    managed_fields = ('subscribers_count',)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = [
@@ -40,6 +68,79 @@ class User(AbstractUser):
         return self.username
 
 
+class UserRelationQuerySet(models.QuerySet):
+    @property
+    def target(self):
+        return next(
+            field for field in self.model._meta.concrete_fields
+            if field.is_relation and field.name != 'user'
+        )
+
+    def execute(self, sql, params):
+        connection = connections[self.db]
+        returning, returning_params = connection.ops.return_insert_columns(
+            (self.target,)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} {returning}', (*params, *returning_params))
+            return [pk for pk, in cursor.fetchall()]
+
+    def add(self, user, targets):
+        target = self.target
+        targets = [target.get_prep_value(pk) for pk in targets]
+        if not targets:
+            return []
+        ops = connections[self.db].ops
+        related = target.related_model._meta
+        sql = ' '.join((
+            ops.insert_statement(on_conflict=OnConflict.IGNORE),
+            ops.quote_name(self.model._meta.db_table),
+            f'({ops.quote_name(self.model._meta.get_field("user").column)}, '
+            f'{ops.quote_name(target.column)})',
+            f'SELECT %s, {ops.quote_name(related.pk.column)}',
+            f'FROM {ops.quote_name(related.db_table)}',
+            f'WHERE {ops.quote_name(related.pk.column)} IN '
+            f'({", ".join(["%s"] * len(targets))})',
+            ops.on_conflict_suffix_sql(
+                (), OnConflict.IGNORE, None, None
+            ),
+        ))
+        with transaction.atomic(using=self.db):
+            added = self.execute(sql, (user.pk, *targets))
+            relations_changed.send(
+                sender=self.model, targets=added, delta=1, using=self.db
+            )
+        return added
+
+    def remove(self, user, targets):
+        target = self.target
+        targets = [target.get_prep_value(pk) for pk in targets]
+        if not targets:
+            return 0
+        ops = connections[self.db].ops
+        owner = self.model._meta.get_field('user')
+        sql = ' '.join((
+            f'DELETE FROM {ops.quote_name(self.model._meta.db_table)}',
+            f'WHERE {ops.quote_name(owner.column)} = %s',
+            f'AND {ops.quote_name(target.column)} IN '
+            f'({", ".join(["%s"] * len(targets))})',
+        ))
+        with transaction.atomic(using=self.db):
+            removed = self.execute(sql, (user.pk, *targets))
+            relations_changed.send(
+                sender=self.model, targets=removed, delta=-1, using=self.db
+            )
+        return len(removed)
+
+    def change_counter(self, targets, delta):
+        counter = getattr(self.model, 'counter', None)
+        if counter is None or not targets:
+            return
+        self.target.related_model._base_manager.using(self.db).filter(
+            pk__in=targets
+        ).update(**{counter: models.F(counter) + delta})
+
+
 class Subscribe(models.Model):
     user = models.ForeignKey(
         User,
@@ -54,6 +155,9 @@ class Subscribe(models.Model):
         verbose_name='Автор'
     )
 
+    objects = UserRelationQuerySet.as_manager()
+    counter = 'subscribers_count'
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'